@@ -0,0 +1,78 @@
+import os
+import statistics
+import subprocess
+import sys
+from optparse import OptionParser
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    'google.protobuf.internal.builder',
+    'ms.protocol_pb2',
+    'ms.base',
+    'ms.rpc',
+    'ms.records',
+    'aiohttp',
+    'fastapi',
+    'uvicorn',
+    'main',
+]
+
+
+# Imports target in a fresh interpreter with -X importtime and returns
+# {module: (self_us, cumulative_us)} for every module it loaded.
+def import_times(target):
+    env = dict(os.environ)
+    # keep main from creating a record store next to the checkout
+    env.setdefault('MJS_RECORD_STORE_PATH', '')
+    # measure a deployed process, which loads cached bytecode
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import {}'.format(target)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def measure(target, repeat):
+    # the first run writes __pycache__ and is not counted
+    import_times(target)
+    runs = [import_times(target) for _ in range(repeat)]
+    result = {}
+    for module in MODULES:
+        samples = [run[module] for run in runs if module in run]
+        if samples:
+            result[module] = (
+                statistics.median(s[0] for s in samples) / 1000,
+                statistics.median(s[1] for s in samples) / 1000,
+            )
+    return result
+
+
+def print_table(title, result):
+    print(title)
+    print('  {:<36} {:>10} {:>12}'.format('module', 'self ms', 'cumulative'))
+    for module, (self_ms, cumulative_ms) in result.items():
+        print('  {:<36} {:>10.1f} {:>12.1f}'.format(module, self_ms, cumulative_ms))
+
+
+def main():
+    parser = OptionParser(usage='%prog [options] [module]')
+    parser.add_option('-r', '--repeat', type='int', default=5)
+    opts, args = parser.parse_args()
+    target = args[0] if args else 'main'
+
+    result = measure(target, opts.repeat)
+    print_table('import {}, median of {}'.format(target, opts.repeat), result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+import asyncio
+import os
+import time
+from optparse import OptionParser
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+# keep the benchmark from creating a record store next to the checkout
+os.environ.setdefault('MJS_RECORD_STORE_PATH', '')
+
+import main as app
+import responses
+from bench.records import make_game_record
+
+
+class RecordLobby:
+    version = '0.0.0.w'
+
+    def __init__(self, res):
+        self._res = res
+
+    async def fetch_game_record(self, req):
+        return self._res
+
+
+def default_render(payload):
+    # what FastAPI does for an endpoint returning a dict
+    return JSONResponse(jsonable_encoder(payload)).body
+
+
+def fast_render(payload):
+    return responses.FastJSONResponse(payload).body
+
+
+def run(render, payload, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = render(payload)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(body)
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('-r', '--repeat', type='int', default=20)
+    parser.add_option('-n', '--rounds', type='int', default=8)
+    opts, _ = parser.parse_args()
+
+    res = make_game_record(rounds=opts.rounds)
+    payload = asyncio.run(app.game_log_as_json(RecordLobby(res), res.head.uuid))
+
+    baseline, size = run(default_render, payload, opts.repeat)
+    fast, fast_size = run(fast_render, payload, opts.repeat)
+
+    print('{} rounds, {} bytes, best of {}'.format(opts.rounds, size, opts.repeat))
+    print('jsonable_encoder + JSONResponse  {:8.2f} ms'.format(baseline * 1000))
+    print('FastJSONResponse                 {:8.2f} ms ({} bytes)'.format(fast * 1000, fast_size))
+    print('speedup                          {:8.2f}x'.format(baseline / fast))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+import asyncio
+import json
+import math
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+import aiohttp
+
+from bench.gateway import FIXTURES, StandInGateway, load_fixtures
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ['record', 'records', 'heads', 'live']
+
+
+# Returns (cpu seconds, rss bytes) of a running process from /proc.
+def process_usage(pid):
+    with open('/proc/{}/stat'.format(pid)) as f:
+        # fields after the command name, which may contain spaces
+        fields = f.read().rsplit(')', 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+    rss = 0
+    with open('/proc/{}/status'.format(pid)) as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                rss = int(line.split()[1]) * 1024
+    return cpu, rss
+
+
+# nearest rank percentile of an already sorted list
+def percentile(ordered, p):
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+# One request of a scenario; returns once the whole body has been read.
+async def request(session, base, scenario, uuids, i):
+    if scenario == 'record':
+        method, path, body = 'GET', '/record/{}'.format(uuids[i % len(uuids)]), None
+    elif scenario == 'records':
+        method, path, body = 'POST', '/records', uuids
+    elif scenario == 'heads':
+        method, path, body = 'POST', '/heads', uuids
+    else:
+        method, path, body = 'GET', '/live', None
+
+    async with session.request(method, base + path, json=body) as res:
+        await res.read()
+        if res.status != 200:
+            raise RuntimeError('{} {} returned {}'.format(method, path, res.status))
+
+
+# Keeps `concurrency` requests in flight for `duration` seconds and returns
+# the latency of every successful one and the number of failures.
+async def drive(session, base, scenario, uuids, concurrency, duration):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    counter = iter(range(sys.maxsize))
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                await request(session, base, scenario, uuids, next(counter))
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, errors
+
+
+async def run_level(session, base, pid, scenario, uuids, concurrency, duration):
+    cpu_before, _ = process_usage(pid)
+    started = time.perf_counter()
+    latencies, errors = await drive(session, base, scenario, uuids, concurrency, duration)
+    elapsed = time.perf_counter() - started
+    cpu_after, rss = process_usage(pid)
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'rps': count / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'cpu_ms_per_request': (cpu_after - cpu_before) * 1000 / count if count else 0.0,
+        'rss_mb': rss / (1024 * 1024),
+    }
+
+
+async def wait_ready(session, base, proc, timeout=60.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if proc.returncode is not None:
+            raise RuntimeError('main.py exited with {}'.format(proc.returncode))
+        try:
+            async with session.get(base + '/status') as res:
+                if res.status == 200:
+                    return
+        except aiohttp.ClientConnectionError:
+            pass
+        await asyncio.sleep(0.05)
+    raise RuntimeError('main.py did not come up within {}s'.format(timeout))
+
+
+# Runs main.py from root, the working tree or a checkout of the reference.
+async def measure(opts, scenarios, levels, root=ROOT):
+    records, live_lists, live_segments = load_fixtures(opts.fixtures)
+    uuids = list(records)
+    gateway = StandInGateway(records, live_lists, live_segments, latency=opts.latency / 1000, jitter=opts.jitter / 1000,
+                             seed=1)
+    gateway_url = await gateway.start()
+
+    port = free_port()
+    base = 'http://127.0.0.1:{}'.format(port)
+    env = dict(os.environ)
+    env.update({
+        'MJS_HOST_URL': gateway_url,
+        'MJS_PORT': str(port),
+        'CN_ACCOUNT_NAME': 'bench',
+        'CN_ACCOUNT_PASS': 'bench',
+        'MJS_RECORD_STORE_PATH': '',
+        'MJS_LIVE_POLL_INTERVAL': '1',
+    })
+    if not opts.cache:
+        # every request goes through MSRPCChannel and game_log_as_json
+        env['MJS_RECORD_CACHE_BYTES'] = '0'
+        env['MJS_HEADER_CACHE_BYTES'] = '0'
+
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, 'main.py', cwd=root, env=env,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+    )
+    results = {}
+    try:
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await wait_ready(session, base, proc)
+            for scenario in scenarios:
+                # warm up the code paths and connections before measuring
+                await drive(session, base, scenario, uuids, max(levels), min(opts.duration, 1.0))
+                for concurrency in levels:
+                    result = await run_level(session, base, proc.pid, scenario, uuids, concurrency, opts.duration)
+                    results['{}@{}'.format(scenario, concurrency)] = result
+                    print_row(scenario, concurrency, result)
+    finally:
+        if proc.returncode is None:
+            proc.terminate()
+            await proc.wait()
+        await gateway.stop()
+    return results
+
+
+def print_header():
+    print('{:<10} {:>5} {:>8} {:>6} {:>9} {:>9} {:>9} {:>9} {:>10} {:>8}'.format(
+        'scenario', 'conc', 'requests', 'errors', 'rps', 'p50 ms', 'p95 ms', 'p99 ms', 'cpu ms/req', 'rss MB'))
+
+
+def print_row(scenario, concurrency, r):
+    print('{:<10} {:>5} {:>8} {:>6} {:>9.1f} {:>9.2f} {:>9.2f} {:>9.2f} {:>10.3f} {:>8.1f}'.format(
+        scenario, concurrency, r['requests'], r['errors'], r['rps'], r['p50_ms'], r['p95_ms'], r['p99_ms'],
+        r['cpu_ms_per_request'], r['rss_mb']), flush=True)
+
+
+# Returns a line per metric that got worse than the reference run by more
+# than tolerance. Latency, CPU and memory regress upwards, throughput downwards.
+# p99 is only reported, a few seconds per level are too few samples to
+# gate on it.
+def compare(results, reference, tolerance):
+    regressions = []
+    for key, result in results.items():
+        base = reference.get(key)
+        if base is None:
+            continue
+        if result['errors'] > base['errors']:
+            regressions.append('{} errors {} -> {}'.format(key, base['errors'], result['errors']))
+        for metric in ('p50_ms', 'p95_ms', 'cpu_ms_per_request', 'rss_mb'):
+            if result[metric] > base[metric] * (1 + tolerance):
+                regressions.append('{} {} {:.3f} -> {:.3f}'.format(key, metric, base[metric], result[metric]))
+        if result['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append('{} rps {:.1f} -> {:.1f}'.format(key, base['rps'], result['rps']))
+    return regressions
+
+
+# Checks ref out into a temporary worktree, so the reference is measured on
+# the same machine and in the same job as the working tree.
+def measure_reference(opts, scenarios, levels):
+    path = tempfile.mkdtemp(prefix='bench_load_')
+    subprocess.run(['git', 'worktree', 'add', '--detach', path, opts.reference], cwd=ROOT, check=True,
+                   stdout=subprocess.DEVNULL)
+    try:
+        return asyncio.run(measure(opts, scenarios, levels, root=path))
+    finally:
+        subprocess.run(['git', 'worktree', 'remove', '--force', path], cwd=ROOT, check=False)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('-s', '--scenario', action='append', default=[],
+                      help='one of {}, repeatable, default all'.format(', '.join(SCENARIOS)))
+    parser.add_option('-c', '--concurrency', default='1,4,16,64', help='comma separated levels')
+    parser.add_option('-d', '--duration', type='float', default=3.0, help='seconds per level')
+    parser.add_option('-f', '--fixtures', default=FIXTURES, help='fixture directory for the gateway')
+    parser.add_option('--latency', type='float', default=0.0, help='gateway latency in ms')
+    parser.add_option('--jitter', type='float', default=0.0, help='gateway jitter in ms')
+    parser.add_option('--cache', action='store_true', default=False,
+                      help='keep the record and header caches on')
+    parser.add_option('-r', '--reference', help='git ref to measure first and compare against, e.g. origin/main')
+    parser.add_option('-o', '--output', help='write the results as JSON')
+    parser.add_option('-t', '--tolerance', type='float', default=0.25,
+                      help='allowed relative regression against the reference')
+    opts, args = parser.parse_args()
+
+    scenarios = opts.scenario or SCENARIOS
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            parser.error('unknown scenario {}'.format(scenario))
+    levels = [int(level) for level in opts.concurrency.split(',') if level.strip()]
+
+    reference = None
+    if opts.reference:
+        print('reference {}'.format(opts.reference))
+        print_header()
+        reference = measure_reference(opts, scenarios, levels)
+        print('working tree')
+
+    print_header()
+    results = asyncio.run(measure(opts, scenarios, levels))
+
+    if opts.output:
+        with open(opts.output, 'w') as f:
+            json.dump({'reference': reference, 'results': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if reference is None:
+        return
+    regressions = compare(results, reference, opts.tolerance)
+    if regressions:
+        print('regressions against {} (tolerance {:.0%}):'.format(opts.reference, opts.tolerance))
+        for line in regressions:
+            print('  ' + line)
+        sys.exit(1)
+    print('no regressions against {}'.format(opts.reference))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import time
+from optparse import OptionParser
+
+from google.protobuf.json_format import MessageToDict
+
+import ms.protocol_pb2 as pb
+from ms.records import message_to_dict
+from bench.records import make_game_record
+
+
+def decode_messages(res):
+    wrapper = pb.Wrapper()
+    wrapper.ParseFromString(res.data)
+    game_details = pb.GameDetailRecords()
+    game_details.ParseFromString(wrapper.data)
+
+    messages = []
+    record_wrapper = pb.Wrapper()
+    for record in game_details.records:
+        record_wrapper.ParseFromString(record)
+        message = getattr(pb, record_wrapper.name.split('.')[-1])()
+        message.ParseFromString(record_wrapper.data)
+        messages.append(message)
+    return messages
+
+
+def run(convert, messages, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for message in messages:
+            convert(message)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('-r', '--repeat', type='int', default=20)
+    parser.add_option('-p', '--players', type='int', default=4)
+    opts, _ = parser.parse_args()
+
+    messages = decode_messages(make_game_record(players=opts.players))
+    for message in messages:
+        assert message_to_dict(message) == MessageToDict(message)
+
+    baseline = run(MessageToDict, messages, opts.repeat)
+    fast = run(message_to_dict, messages, opts.repeat)
+
+    print('{} records, best of {}'.format(len(messages), opts.repeat))
+    print('MessageToDict    {:8.2f} ms'.format(baseline * 1000))
+    print('message_to_dict  {:8.2f} ms'.format(fast * 1000))
+    print('speedup          {:8.2f}x'.format(baseline / fast))
+
+
+if __name__ == '__main__':
+    main()
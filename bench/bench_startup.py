@@ -0,0 +1,203 @@
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import time
+from optparse import OptionParser
+
+import aiohttp
+
+from bench.gateway import StandInGateway
+from bench.records import make_game_record
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+UUID = '000000-00000000-0000-0000-0000-000000000000'
+
+PHASES = [
+    'interpreter',
+    'import ms.protocol_pb2',
+    'import ms.rpc',
+    'import fastapi',
+    'import main',
+    'connect',
+    'login',
+    'first record',
+]
+
+# Runs in a fresh interpreter and prints the time spent in every phase of
+# bringing the service up, in the same order main.py goes through them.
+PROBE = '''
+import time
+started = time.time()
+phases = {"interpreter": started - float(__import__("os").environ["BENCH_SPAWNED_AT"])}
+mark = time.perf_counter()
+
+def lap(name):
+    global mark
+    now = time.perf_counter()
+    phases[name] = now - mark
+    mark = now
+
+import ms.protocol_pb2
+lap("import ms.protocol_pb2")
+import ms.rpc
+lap("import ms.rpc")
+import fastapi
+lap("import fastapi")
+import main
+lap("import main")
+
+import asyncio, json, os
+
+async def run():
+    lap("setup")
+    lobby, channel = await main.connect()
+    lap("connect")
+    if not await main.login(lobby, os.environ["CN_ACCOUNT_NAME"], os.environ["CN_ACCOUNT_PASS"]):
+        raise SystemExit("login failed")
+    lap("login")
+    await main.game_log_as_json(lobby, os.environ["BENCH_UUID"])
+    lap("first record")
+    await channel.close()
+    await main.cache.pop("http").close()
+
+asyncio.run(run())
+phases.pop("setup")
+print(json.dumps(phases))
+'''
+
+
+def child_env(gateway_url, port=None):
+    env = dict(os.environ)
+    env.update({
+        'MJS_HOST_URL': gateway_url,
+        'CN_ACCOUNT_NAME': 'bench',
+        'CN_ACCOUNT_PASS': 'bench',
+        # every run has to fetch the record from the gateway
+        'MJS_RECORD_STORE_PATH': '',
+        'BENCH_UUID': UUID,
+        'BENCH_SPAWNED_AT': repr(time.time()),
+    })
+    if port is not None:
+        env['MJS_PORT'] = str(port)
+    # measure a deployed process, which loads cached bytecode
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    return env
+
+
+async def probe(gateway_url):
+    env = child_env(gateway_url)
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, '-c', PROBE, cwd=ROOT, env=env,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+    )
+    out, err = await proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError('probe failed:\n{}'.format(err.decode()))
+    return json.loads(out.decode().strip().splitlines()[-1])
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+# Wall time from spawning `python main.py` to the first 200 from /record.
+async def end_to_end(gateway_url, timeout=60.0):
+    port = free_port()
+    url = 'http://127.0.0.1:{}/record/{}'.format(port, UUID)
+    started = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, 'main.py', cwd=ROOT, env=child_env(gateway_url, port),
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        async with aiohttp.ClientSession() as session:
+            while time.perf_counter() - started < timeout:
+                if proc.returncode is not None:
+                    raise RuntimeError('main.py exited with {}'.format(proc.returncode))
+                try:
+                    async with session.get(url) as res:
+                        if res.status == 200:
+                            await res.read()
+                            return time.perf_counter() - started
+                except aiohttp.ClientConnectionError:
+                    pass
+                await asyncio.sleep(0.005)
+        raise RuntimeError('no /record response within {}s'.format(timeout))
+    finally:
+        if proc.returncode is None:
+            proc.terminate()
+            await proc.wait()
+
+
+async def measure(repeat):
+    gateway = StandInGateway({UUID: make_game_record(UUID)})
+    gateway_url = await gateway.start()
+    try:
+        # the first run writes __pycache__ and is not counted
+        await probe(gateway_url)
+        runs = []
+        for _ in range(repeat):
+            phases = await probe(gateway_url)
+            phases['total'] = await end_to_end(gateway_url)
+            runs.append(phases)
+    finally:
+        await gateway.stop()
+
+    return {name: statistics.median(run[name] for run in runs) * 1000 for name in PHASES + ['total']}
+
+
+# Budgets in milliseconds, e.g. "total=3000,import main=800". Phases without
+# a budget are only reported.
+def parse_budgets(values):
+    budgets = {}
+    for value in values:
+        for item in value.split(','):
+            if not item.strip():
+                continue
+            name, ms = item.rsplit('=', 1)
+            name = name.strip()
+            if name not in PHASES and name != 'total':
+                raise ValueError('unknown phase {!r}'.format(name))
+            budgets[name] = float(ms)
+    return budgets
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('-r', '--repeat', type='int', default=5)
+    parser.add_option('-b', '--budget', action='append', default=[],
+                      help='phase=ms[,phase=ms...], also read from MJS_STARTUP_BUDGET')
+    opts, args = parser.parse_args()
+
+    budgets = parse_budgets([os.environ.get('MJS_STARTUP_BUDGET', '')] + opts.budget)
+    result = asyncio.run(measure(opts.repeat))
+
+    print('startup to first /record, median of {}'.format(opts.repeat))
+    print('  {:<24} {:>10} {:>10}'.format('phase', 'ms', 'budget'))
+    over = []
+    for name in PHASES + ['total']:
+        budget = budgets.get(name)
+        flag = ''
+        if budget is not None and result[name] > budget:
+            over.append(name)
+            flag = '  OVER'
+        print('  {:<24} {:>10.1f} {:>10}{}'.format(
+            name, result[name], '' if budget is None else '{:.0f}'.format(budget), flag))
+    # "total" comes from separate `python main.py` runs that also pay for
+    # uvicorn and the HTTP round trip, so the phases do not add up to it
+    print('  {:<24} {:>10.1f}'.format('sum of phases', sum(result[name] for name in PHASES)))
+
+    if over:
+        print('budget exceeded: {}'.format(', '.join(over)))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
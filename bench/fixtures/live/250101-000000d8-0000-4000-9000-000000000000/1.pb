@@ -0,0 +1,82 @@
+
+.lq.GameLiveSegment
+
+.lq.RecordNewRound*:9m:5m:8p:4m:7p:7s:6p:3z:3s:4p:7m:4z:9s:1mB7sB1zB1mB5sB6pB9mB6sB8sB8mB1sB4mB2pB5zJ2mJ7zJ1mJ4zJ2zJ4pJ4sJ7mJ5pJ6sJ5zJ8pJ8mR2zR5zR6pR3pR8mR4sR3zR7sR6zR1pR1mR5pR9pxE7m
+#
+.lq.RecordDealTile3pE
+$
+.lq.RecordDiscardTile1s
+%
+.lq.RecordDealTile8mD
+(!
+.lq.RecordDiscardTile4s(
+%'
+.lq.RecordDealTile6zC
+&.
+.lq.RecordDiscardTile1z
+%6
+.lq.RecordDealTile6zB
+(>!
+.lq.RecordDiscardTile4p(
+#F
+.lq.RecordDealTile2sA
+$N
+.lq.RecordDiscardTile1s
+%U
+.lq.RecordDealTile5z@
+(]!
+.lq.RecordDiscardTile6z(
+5e.
+.lq.RecordChiPengGang6z6z6z"
+%m
+.lq.RecordDealTile8s?
+&u
+.lq.RecordDiscardTile3m
+%}
+.lq.RecordDealTile4z>
+)!
+.lq.RecordDiscardTile7p(
+$Ќ
+.lq.RecordDealTile8s=
+%
+.lq.RecordDiscardTile9s
+&
+.lq.RecordDealTile3p<
+)!
+.lq.RecordDiscardTile6s(
+&
+.lq.RecordDealTile6s;
+'س
+.lq.RecordDiscardTile6m
+&
+.lq.RecordDealTile2z:
+)!
+.lq.RecordDiscardTile6z(
+$
+.lq.RecordDealTile7m9
+%
+.lq.RecordDiscardTile2p
+&
+.lq.RecordDealTile7z8
+)!
+.lq.RecordDiscardTile8s(
+&
+.lq.RecordDealTile6s7
+'
+.lq.RecordDiscardTile5z
+&
+.lq.RecordDealTile2m6
+)!
+.lq.RecordDiscardTile4z(
+$Љ
+.lq.RecordDealTile3m5
+%
+.lq.RecordDiscardTile2s
+&
+.lq.RecordDealTile8s4
+)!
+.lq.RecordDiscardTile2p(
+&
+.lq.RecordDealTile2p3
+'ذ
+.lq.RecordDiscardTile6z
\ No newline at end of file
@@ -0,0 +1,82 @@
+
+.lq.GameLiveSegment
+&
+.lq.RecordDealTile6p2
+)!
+.lq.RecordDiscardTile1m(
+$
+.lq.RecordDealTile4p1
+%
+.lq.RecordDiscardTile6p
+&
+.lq.RecordDealTile8s0
+)!
+.lq.RecordDiscardTile6z(
+&
+.lq.RecordDealTile5s/
+'
+.lq.RecordDiscardTile5s
+6.
+.lq.RecordChiPengGang5s5s5s"
+&
+.lq.RecordDealTile3z.
+)І!
+.lq.RecordDiscardTile9p(
+$
+.lq.RecordDealTile1m-
+%
+.lq.RecordDiscardTile7s
+&
+.lq.RecordDealTile6z,
+)!
+.lq.RecordDiscardTile9m(
+&ح
+.lq.RecordDealTile7z+
+'
+.lq.RecordDiscardTile5p
+&
+.lq.RecordDealTile1z*
+)!
+.lq.RecordDiscardTile4m(
+$
+.lq.RecordDealTile4z)
+%
+.lq.RecordDiscardTile6s
+&
+.lq.RecordDealTile4p(
+)!
+.lq.RecordDiscardTile6z(
+&
+.lq.RecordDealTile9s'
+'
+.lq.RecordDiscardTile5z
+&
+.lq.RecordDealTile5s&
+)Ѓ!
+.lq.RecordDiscardTile9s(
+$
+.lq.RecordDealTile5s%
+%
+.lq.RecordDiscardTile1m
+&
+.lq.RecordDealTile4s$
+)!
+.lq.RecordDiscardTile3z(
+&ت
+.lq.RecordDealTile2m#
+'
+.lq.RecordDiscardTile6p
+&
+.lq.RecordDealTile3p"
+)!
+.lq.RecordDiscardTile3p(
+$
+.lq.RecordDealTile6m!
+%
+.lq.RecordDiscardTile8p
+&
+.lq.RecordDealTile3m 
+)!
+.lq.RecordDiscardTile5m(
+&
+.lq.RecordDealTile6m
\ No newline at end of file
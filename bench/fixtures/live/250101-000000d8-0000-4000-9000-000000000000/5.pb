@@ -0,0 +1,99 @@
+
+.lq.GameLiveSegment
+6	.
+.lq.RecordChiPengGang3m3m3m"
+&	
+.lq.RecordDealTile9s?
+'	
+.lq.RecordDiscardTile5m
+&	
+.lq.RecordDealTile7s>
+)
+!
+.lq.RecordDiscardTile1p(
+$
+
+.lq.RecordDealTile9m=
+%
+
+.lq.RecordDiscardTile4s
+&ؘ
+
+.lq.RecordDealTile8m<
+)
+!
+.lq.RecordDiscardTile7s(
+&
+
+.lq.RecordDealTile5m;
+'
+
+.lq.RecordDiscardTile6p
+&
+
+.lq.RecordDealTile6m:
+)
+!
+.lq.RecordDiscardTile9p(
+$
+
+.lq.RecordDealTile6s9
+%
+
+.lq.RecordDiscardTile1s
+&
+
+.lq.RecordDealTile8m8
+)
+!
+.lq.RecordDiscardTile3z(
+&
+
+.lq.RecordDealTile9p7
+'
+
+.lq.RecordDiscardTile7m
+&
+
+.lq.RecordDealTile3m6
+)
+!
+.lq.RecordDiscardTile1s(
+$
+.lq.RecordDealTile1m5
+%
+.lq.RecordDiscardTile1m
+&ؕ
+.lq.RecordDealTile6m4
+)!
+.lq.RecordDiscardTile9s(
+&
+.lq.RecordDealTile8m3
+'
+.lq.RecordDiscardTile3m
+&
+.lq.RecordDealTile4p2
+)!
+.lq.RecordDiscardTile7p(
+$
+.lq.RecordDealTile9s1
+%
+.lq.RecordDiscardTile2p
+&
+.lq.RecordDealTile8m0
+)!
+.lq.RecordDiscardTile2z(
+&
+.lq.RecordDealTile2p/
+'
+.lq.RecordDiscardTile7p
+6.
+.lq.RecordChiPengGang7p7p7p"
+&
+.lq.RecordDealTile2p.
+)!
+.lq.RecordDiscardTile7m(
+$
+.lq.RecordDealTile1z-
+%ؒ
+.lq.RecordDiscardTile7s
\ No newline at end of file
@@ -0,0 +1,423 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from optparse import OptionParser
+
+from aiohttp import WSMsgType, web
+from google.protobuf.json_format import ParseDict
+
+import ms.protocol_pb2 as pb
+
+
+VERSION = '0.11.0.w'
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# main.py answers this code with 404 (MJS_RECORD_NOT_FOUND_CODES)
+NOT_FOUND = 1203
+
+
+# Reads a fixture directory: records/<uuid>.pb holds serialized
+# ResGameRecord messages as the server sends them, live_list.json maps a
+# live filter id to a list of GameLiveHead objects in protobuf JSON and
+# live/<uuid>/<segment_id>.pb are the segment files of a game that can be
+# tailed. Returns (records, live_lists, live_segments).
+def load_fixtures(path=FIXTURES):
+    records = {}
+    records_dir = os.path.join(path, 'records')
+    if os.path.isdir(records_dir):
+        for name in sorted(os.listdir(records_dir)):
+            if not name.endswith('.pb'):
+                continue
+            res = pb.ResGameRecord()
+            with open(os.path.join(records_dir, name), 'rb') as f:
+                res.ParseFromString(f.read())
+            records[res.head.uuid or name[:-len('.pb')]] = res
+
+    live_lists = {}
+    live_path = os.path.join(path, 'live_list.json')
+    if os.path.exists(live_path):
+        with open(live_path) as f:
+            for mode, heads in json.load(f).items():
+                live_lists[int(mode)] = [ParseDict(head, pb.GameLiveHead()) for head in heads]
+
+    live_segments = {}
+    live_dir = os.path.join(path, 'live')
+    if os.path.isdir(live_dir):
+        for uuid in sorted(os.listdir(live_dir)):
+            names = [name for name in os.listdir(os.path.join(live_dir, uuid)) if name.endswith('.pb')]
+            segments = []
+            for name in sorted(names, key=lambda name: int(name[:-len('.pb')])):
+                with open(os.path.join(live_dir, uuid, name), 'rb') as f:
+                    segments.append(f.read())
+            live_segments[uuid] = segments
+
+    return records, live_lists, live_segments
+
+
+# Serializes one websocket's responses and can hold one back until the next
+# one went out, which is how responses get reordered on purpose.
+class _Connection:
+
+    def __init__(self, ws, hold_timeout):
+        self._ws = ws
+        self._hold_timeout = hold_timeout
+        self._lock = asyncio.Lock()
+        self._held = None
+        self._tasks = set()
+        self.reordered = 0
+
+    async def send(self, data, hold=False):
+        async with self._lock:
+            if hold and self._held is None:
+                self._held = data
+                # nothing may come after it, let it go on its own eventually
+                task = asyncio.create_task(self._release(data))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                return
+            await self._ws.send_bytes(data)
+            if self._held is not None:
+                held, self._held = self._held, None
+                await self._ws.send_bytes(held)
+                self.reordered += 1
+
+    async def _release(self, data):
+        await asyncio.sleep(self._hold_timeout)
+        async with self._lock:
+            if self._held is data:
+                self._held = None
+                await self._ws.send_bytes(data)
+
+    def close(self):
+        for task in self._tasks:
+            task.cancel()
+
+
+# Local Majsoul server: the HTTP version/config endpoints and a websocket
+# gateway speaking the same framing as MSRPCChannel (a type byte, a 2 byte
+# little endian request index and a Wrapper), answering from fixtures.
+#
+# Every response is delayed by latency +/- jitter seconds, dropped with
+# probability drop_rate and held back behind the next response on the same
+# connection with probability reorder_rate. With data_url=True records are
+# served by link like newer games, from /records/<uuid> on the same server.
+#
+# Games in live_segments can be tailed: their segments, numbered from 1, are
+# published one every segment_interval seconds from the first
+# fetchGameLiveInfo on (all at once for 0) and downloaded from
+# /live/<uuid>/<segment_id>. Once the last one was fetched
+# fetchGameLiveLeftSegment answers with an error, as for a finished game.
+class StandInGateway:
+
+    def __init__(self, records=None, live_lists=None, live_segments=None, version=VERSION, latency=0.0,
+                 jitter=0.0, drop_rate=0.0, reorder_rate=0.0, data_url=False, segment_interval=0.0, seed=None):
+        self.version = version
+        # uuid -> ResGameRecord
+        self.records = dict(records or {})
+        # live filter id -> [GameLiveHead]
+        self.live_lists = dict(live_lists or {})
+        # uuid -> [segment file], segment ids start at 1
+        self.live_segments = dict(live_segments or {})
+        self.segment_interval = segment_interval
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.reorder_rate = reorder_rate
+        self.data_url = data_url
+
+        self.requests = 0
+        self.dropped = 0
+        self.downloads = 0
+        self.segment_downloads = 0
+        self.url = None
+
+        self._random = random.Random(seed)
+        self._runner = None
+        self._connections = set()
+        self._reordered = 0
+        # uuid -> time the game was first asked for
+        self._live_started = {}
+
+        self._handlers = {
+            'heatbeat': self.heatbeat,
+            'login': self.login,
+            'logout': self.logout,
+            'fetchGameRecord': self.fetch_game_record,
+            'fetchGameRecordList': self.fetch_game_record_list,
+            'fetchGameRecordsDetail': self.fetch_game_records_detail,
+            'fetchGameLiveList': self.fetch_game_live_list,
+            'fetchGameLiveInfo': self.fetch_game_live_info,
+            'fetchGameLiveLeftSegment': self.fetch_game_live_left_segment,
+        }
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/1/version.json', self.version_json)
+        app.router.add_get('/1/v{version}/config.json', self.config_json)
+        app.router.add_get('/gateway', self.gateway)
+        app.router.add_get('/records/{uuid}', self.record_data)
+        app.router.add_get('/live/{uuid}/{segment_id}', self.live_segment_data)
+        return app
+
+    async def start(self, host='127.0.0.1', port=0):
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = 'http://{}:{}'.format(host, port)
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'dropped': self.dropped,
+            'reordered': self._reordered + sum(conn.reordered for conn in self._connections),
+            'downloads': self.downloads,
+            'segment_downloads': self.segment_downloads,
+            'connections': len(self._connections),
+        }
+
+    async def version_json(self, request):
+        return web.json_response({'version': self.version})
+
+    async def config_json(self, request):
+        # connect() picks the second gateway of the first ip entry
+        gateway = {'url': self.url}
+        return web.json_response({'ip': [{'gateways': [gateway, gateway]}]})
+
+    async def record_data(self, request):
+        res = self.records.get(request.match_info['uuid'])
+        if res is None:
+            raise web.HTTPNotFound()
+        self.downloads += 1
+        return web.Response(body=res.data, content_type='application/octet-stream')
+
+    async def live_segment_data(self, request):
+        segments = self.live_segments.get(request.match_info['uuid'])
+        try:
+            segment_id = int(request.match_info['segment_id'])
+        except ValueError:
+            raise web.HTTPNotFound()
+        if segments is None or not 1 <= segment_id <= len(segments):
+            raise web.HTTPNotFound()
+        self.segment_downloads += 1
+        return web.Response(body=segments[segment_id - 1], content_type='application/octet-stream')
+
+    async def gateway(self, request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+
+        conn = _Connection(ws, hold_timeout=max(self.latency + self.jitter, 0.01) * 2)
+        self._connections.add(conn)
+        replies = set()
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.BINARY or msg.data[0] != 2:
+                    continue
+                # answer concurrently so a slow response does not hold up
+                # the ones behind it, like the real gateway
+                task = asyncio.create_task(self.reply(conn, msg.data))
+                replies.add(task)
+                task.add_done_callback(replies.discard)
+        finally:
+            for task in replies:
+                task.cancel()
+            conn.close()
+            self._connections.discard(conn)
+            self._reordered += conn.reordered
+        return ws
+
+    async def reply(self, conn, msg):
+        data = self.respond(msg)
+        if self.drop_rate and self._random.random() < self.drop_rate:
+            self.dropped += 1
+            return
+
+        delay = self.latency
+        if self.jitter:
+            delay += self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        hold = bool(self.reorder_rate) and self._random.random() < self.reorder_rate
+        try:
+            await conn.send(data, hold)
+        except ConnectionError:
+            pass
+
+    def respond(self, msg):
+        self.requests += 1
+        idx = msg[1:3]
+        wrapper = pb.Wrapper()
+        wrapper.ParseFromString(msg[3:])
+        method = wrapper.name.rsplit('.', 1)[-1]
+
+        handler = self._handlers.get(method)
+        if handler is None:
+            # error is field 1 of every response type, so ResCommon decodes
+            # as whatever the client expects
+            res = pb.ResCommon()
+            res.error.code = NOT_FOUND
+        else:
+            res = handler(wrapper.data)
+
+        out = pb.Wrapper()
+        out.data = res.SerializeToString()
+        return b'\x03' + idx + out.SerializeToString()
+
+    def heatbeat(self, data):
+        return pb.ResCommon()
+
+    def login(self, data):
+        req = pb.ReqLogin()
+        req.ParseFromString(data)
+        res = pb.ResLogin()
+        res.account_id = 1
+        res.account.nickname = req.account
+        res.access_token = 'stand-in'
+        return res
+
+    def logout(self, data):
+        return pb.ResLogout()
+
+    def fetch_game_record(self, data):
+        req = pb.ReqGameRecord()
+        req.ParseFromString(data)
+        record = self.records.get(req.game_uuid)
+        res = pb.ResGameRecord()
+        if record is None:
+            res.error.code = NOT_FOUND
+        elif self.data_url:
+            res.head.CopyFrom(record.head)
+            res.data_url = '{}/records/{}'.format(self.url, req.game_uuid)
+        else:
+            res.CopyFrom(record)
+        return res
+
+    def fetch_game_record_list(self, data):
+        req = pb.ReqGameRecordList()
+        req.ParseFromString(data)
+        # newest first, start is 1 based
+        heads = sorted((record.head for record in self.records.values()), key=lambda head: -head.end_time)
+        res = pb.ResGameRecordList()
+        res.total_count = len(heads)
+        start = max(req.start, 1) - 1
+        res.record_list.extend(heads[start:start + req.count])
+        return res
+
+    def fetch_game_records_detail(self, data):
+        req = pb.ReqGameRecordsDetail()
+        req.ParseFromString(data)
+        res = pb.ResGameRecordsDetail()
+        res.record_list.extend(self.records[uuid].head for uuid in req.uuid_list if uuid in self.records)
+        return res
+
+    def fetch_game_live_list(self, data):
+        req = pb.ReqGameLiveList()
+        req.ParseFromString(data)
+        res = pb.ResGameLiveList()
+        res.live_list.extend(self.live_lists.get(req.filter_id, []))
+        return res
+
+    def _published(self, uuid):
+        segments = self.live_segments[uuid]
+        if not self.segment_interval:
+            return len(segments)
+        started = self._live_started.setdefault(uuid, time.monotonic())
+        return min(len(segments), 1 + int((time.monotonic() - started) / self.segment_interval))
+
+    def _segment_uris(self, uuid, after, published):
+        uris = []
+        for segment_id in range(after + 1, published + 1):
+            uri = pb.GameLiveSegmentUri()
+            uri.segment_id = segment_id
+            # relative, main.py resolves it against MJS_LIVE_SEGMENT_URL
+            uri.segment_uri = 'live/{}/{}'.format(uuid, segment_id)
+            uris.append(uri)
+        return uris
+
+    def fetch_game_live_info(self, data):
+        req = pb.ReqGameLiveInfo()
+        req.ParseFromString(data)
+        res = pb.ResGameLiveInfo()
+        if req.game_uuid not in self.live_segments:
+            res.error.code = NOT_FOUND
+            return res
+
+        for heads in self.live_lists.values():
+            for head in heads:
+                if head.uuid == req.game_uuid:
+                    res.live_head.CopyFrom(head)
+        res.live_head.uuid = req.game_uuid
+        res.segments.extend(self._segment_uris(req.game_uuid, 0, self._published(req.game_uuid)))
+        return res
+
+    def fetch_game_live_left_segment(self, data):
+        req = pb.ReqGameLiveLeftSegment()
+        req.ParseFromString(data)
+        res = pb.ResGameLiveLeftSegment()
+        if req.game_uuid not in self.live_segments:
+            res.error.code = NOT_FOUND
+            return res
+
+        published = self._published(req.game_uuid)
+        if published == len(self.live_segments[req.game_uuid]) and req.last_segment_id >= published:
+            # the game is over
+            res.error.code = NOT_FOUND
+            return res
+        res.segments.extend(self._segment_uris(req.game_uuid, req.last_segment_id, published))
+        return res
+
+
+async def serve(opts):
+    records, live_lists, live_segments = load_fixtures(opts.fixtures)
+    gateway = StandInGateway(
+        records, live_lists, live_segments, latency=opts.latency / 1000, jitter=opts.jitter / 1000,
+        drop_rate=opts.drop_rate, reorder_rate=opts.reorder_rate, data_url=opts.data_url,
+        segment_interval=opts.segment_interval / 1000, seed=opts.seed,
+    )
+    url = await gateway.start(opts.host, opts.port)
+    logging.info("Stand-in gateway on {}, {} records, {} live lists".format(url, len(records), len(live_lists)))
+    for uuid in records:
+        logging.info("Record {}".format(uuid))
+    for uuid, segments in live_segments.items():
+        logging.info("Live game {}, {} segments".format(uuid, len(segments)))
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await gateway.stop()
+
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--host', default='127.0.0.1')
+    parser.add_option('-p', '--port', type='int', default=9000)
+    parser.add_option('-f', '--fixtures', default=FIXTURES)
+    parser.add_option('--latency', type='float', default=0.0, help='ms added to every response')
+    parser.add_option('--jitter', type='float', default=0.0, help='+/- ms around the latency')
+    parser.add_option('--drop-rate', type='float', default=0.0, help='share of responses never sent')
+    parser.add_option('--reorder-rate', type='float', default=0.0,
+                      help='share of responses held back behind the next one')
+    parser.add_option('--data-url', action='store_true', default=False,
+                      help='serve records by link instead of inline')
+    parser.add_option('--segment-interval', type='float', default=0.0,
+                      help='ms between published live segments, 0 publishes all at once')
+    parser.add_option('--seed', type='int', default=None)
+    opts, args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+    asyncio.run(serve(opts))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+import json
+import os
+import random
+from optparse import OptionParser
+
+from google.protobuf.json_format import MessageToDict
+
+import ms.protocol_pb2 as pb
+from bench.gateway import FIXTURES
+from bench.records import make_game_record, make_round
+
+
+# uuid -> make_game_record() arguments
+RECORDS = {
+    '250101-00000000-0000-4000-8000-000000000004': {'players': 4},
+    # sanma, with RecordBaBei
+    '250101-00000000-0000-4000-8000-000000000003': {'players': 3},
+    # newer GameDetailRecords.actions format
+    '250101-00000000-0000-4000-8000-0000000000a4': {'players': 4, 'actions': True},
+}
+
+# live filter id -> number of games in progress
+LIVE_LISTS = {
+    216: 3,
+    215: 2,
+    226: 1,
+}
+
+# the first game of these modes can be tailed through fetchGameLiveInfo
+TAILED_MODES = (216,)
+TAILED_ROUNDS = 2
+SEGMENT_SIZE = 40
+
+
+def make_live_head(mode, index):
+    head = pb.GameLiveHead()
+    head.uuid = '250101-{:08x}-0000-4000-9000-{:012x}'.format(mode, index)
+    head.start_time = 1735689600 + index * 60
+    head.game_config.category = 2
+    head.game_config.mode.mode = 1
+    for seat in range(4):
+        player = head.players.add()
+        player.account_id = 2000 + index * 4 + seat
+        player.nickname = 'live{}'.format(index * 4 + seat)
+        head.seat_list.append(player.account_id)
+    return head
+
+
+# Splits the wrapped records of a few synthetic rounds into GameLiveSegment
+# files of SEGMENT_SIZE actions each, every one wrapped like the server's.
+def make_live_segments(seed):
+    rnd = random.Random(seed)
+    records = []
+    for round_index in range(TAILED_ROUNDS):
+        records.extend(make_round(rnd, round_index, 4))
+
+    segments = []
+    for start in range(0, len(records), SEGMENT_SIZE):
+        segment = pb.GameLiveSegment()
+        for offset, record in enumerate(records[start:start + SEGMENT_SIZE]):
+            unit = segment.actions.add()
+            unit.timestamp = (start + offset) * 1000
+            unit.action_category = 1
+            unit.action_data = record
+        wrapper = pb.Wrapper()
+        wrapper.name = '.lq.GameLiveSegment'
+        wrapper.data = segment.SerializeToString()
+        segments.append(wrapper.SerializeToString())
+    return segments
+
+
+# Writes the fixture set StandInGateway loads by default: synthetic records
+# from bench.records, a few live lists and the segments of the tailed games.
+def write_fixtures(path=FIXTURES):
+    records_dir = os.path.join(path, 'records')
+    os.makedirs(records_dir, exist_ok=True)
+    for seed, (uuid, kwargs) in enumerate(RECORDS.items(), 1):
+        res = make_game_record(uuid, seed=seed, **kwargs)
+        with open(os.path.join(records_dir, '{}.pb'.format(uuid)), 'wb') as f:
+            f.write(res.SerializeToString())
+
+    live_lists = {}
+    index = 0
+    for mode, count in LIVE_LISTS.items():
+        live_lists[str(mode)] = []
+        for position in range(count):
+            head = make_live_head(mode, index)
+            live_lists[str(mode)].append(MessageToDict(head))
+            index += 1
+            if mode in TAILED_MODES and position == 0:
+                write_live_segments(path, head.uuid, make_live_segments(index))
+    with open(os.path.join(path, 'live_list.json'), 'w') as f:
+        json.dump(live_lists, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def write_live_segments(path, uuid, segments):
+    live_dir = os.path.join(path, 'live', uuid)
+    os.makedirs(live_dir, exist_ok=True)
+    for segment_id, data in enumerate(segments, 1):
+        with open(os.path.join(live_dir, '{}.pb'.format(segment_id)), 'wb') as f:
+            f.write(data)
+
+
+def main():
+    parser = OptionParser(usage='%prog [path]')
+    opts, args = parser.parse_args()
+    write_fixtures(args[0] if args else FIXTURES)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+import random
+
+import ms.protocol_pb2 as pb
+
+
+TILES = ['{}{}'.format(n, s) for s in 'mpsz' for n in range(1, 10) if not (s == 'z' and n > 7)]
+
+
+def wrap(msg):
+    wrapper = pb.Wrapper()
+    wrapper.name = '.lq.{}'.format(type(msg).__name__)
+    wrapper.data = msg.SerializeToString()
+    return wrapper.SerializeToString()
+
+
+def make_round(rnd, round_index, players):
+    records = []
+
+    new_round = pb.RecordNewRound()
+    new_round.chang = round_index // players
+    new_round.ju = round_index % players
+    new_round.scores.extend([25000] * players)
+    new_round.tiles0.extend(rnd.sample(TILES, 14))
+    for seat in range(1, players):
+        getattr(new_round, 'tiles{}'.format(seat)).extend(rnd.sample(TILES, 13))
+    new_round.doras.append(rnd.choice(TILES))
+    new_round.left_tile_count = 69
+    records.append(wrap(new_round))
+
+    for turn in range(70):
+        seat = turn % players
+
+        deal = pb.RecordDealTile()
+        deal.seat = seat
+        deal.tile = rnd.choice(TILES)
+        deal.left_tile_count = 69 - turn
+        records.append(wrap(deal))
+
+        discard = pb.RecordDiscardTile()
+        discard.seat = seat
+        discard.tile = rnd.choice(TILES)
+        discard.moqie = turn % 2 == 1
+        records.append(wrap(discard))
+
+        if turn % 17 == 5:
+            call = pb.RecordChiPengGang()
+            call.seat = (seat + 1) % players
+            call.type = 1
+            call.tiles.extend([discard.tile] * 3)
+            call.froms.extend([seat, seat, (seat + 1) % players])
+            records.append(wrap(call))
+
+        if players == 3 and turn % 23 == 7:
+            babei = pb.RecordBaBei()
+            babei.seat = seat
+            records.append(wrap(babei))
+
+        if turn == 40:
+            kan = pb.RecordAnGangAddGang()
+            kan.seat = seat
+            kan.type = 3
+            kan.tiles = discard.tile
+            records.append(wrap(kan))
+
+    hule = pb.RecordHule()
+    info = hule.hules.add()
+    info.seat = round_index % players
+    info.hu_tile = rnd.choice(TILES)
+    info.zimo = round_index % 2 == 0
+    info.point_rong = 3900
+    info.fu = 30
+    info.count = 3
+    for fan_id in (1, 7, 31):
+        fan = info.fans.add()
+        fan.id = fan_id
+        fan.val = 1
+    info.hand.extend(rnd.sample(TILES, 13))
+    hule.delta_scores.extend([3900, -3900] + [0] * (players - 2))
+    hule.scores.extend([28900, 21100] + [25000] * (players - 2))
+    records.append(wrap(hule))
+
+    return records
+
+
+# Builds a synthetic but structurally complete ResGameRecord: a hanchan of
+# `rounds` hands with draws, discards, calls, kans, kita for 3 player games
+# and a win per hand. actions=True stores the records in the newer
+# GameDetailRecords.actions format.
+def make_game_record(uuid='000000-00000000-0000-0000-0000-000000000000', rounds=8, players=4, actions=False, seed=1):
+    rnd = random.Random(seed)
+
+    records = []
+    for round_index in range(rounds):
+        records.extend(make_round(rnd, round_index, players))
+
+    game_details = pb.GameDetailRecords()
+    if actions:
+        game_details.version = 210715
+        for record in records:
+            action = game_details.actions.add()
+            action.type = 1
+            action.result = record
+    else:
+        game_details.records.extend(records)
+
+    wrapper = pb.Wrapper()
+    wrapper.name = '.lq.GameDetailRecords'
+    wrapper.data = game_details.SerializeToString()
+
+    res = pb.ResGameRecord()
+    res.head.uuid = uuid
+    res.head.start_time = 1610000000
+    res.head.end_time = 1610003600
+    res.head.config.category = 2
+    res.head.config.mode.mode = 1 if players == 4 else 11
+    for seat in range(players):
+        account = res.head.accounts.add()
+        account.account_id = 1000 + seat
+        account.seat = seat
+        account.nickname = 'player{}'.format(seat)
+        player = res.head.result.players.add()
+        player.seat = seat
+        player.total_point = 25000
+    res.data = wrapper.SerializeToString()
+    return res
@@ -1,6 +1,7 @@
 from collections import UserDict
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 
 import asyncio
 import hashlib
@@ -10,15 +11,25 @@ import random
 import uuid
 import json
 from optparse import OptionParser
+from urllib.parse import urljoin
 
 import aiohttp
 import os
 from dotenv import load_dotenv
 
-from ms.base import MSRPCChannel
+from ms.base import MSRPCChannel, MSRPCTimeoutError
+from ms.pool import MSRPCChannelPool
+from ms.reconnect import ReconnectCoordinator
+from ms.cache import Coalescer, LRUCache, MicroBatcher
+from ms.store import RecordStore
+from ms.crawler import RecordListCrawler
+from ms.live import LiveGameError, LiveGameStore, LiveGameTail, LivePoller
 from ms.rpc import Lobby
 import ms.protocol_pb2 as pb
+from responses import FastJSONResponse, json_dumps
+from ms.records import GameRecordError, GameRecordNotFound, message_to_dict, game_header, game_record_as_json, game_records, iter_rounds
 from google.protobuf.json_format import MessageToJson, MessageToDict
+from google.protobuf.message import DecodeError
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
@@ -27,6 +38,44 @@ logging.basicConfig(
 load_dotenv()
 
 MS_HOST = os.environ.get('MJS_HOST_URL')
+RPC_TIMEOUT = float(os.environ.get('MJS_RPC_TIMEOUT', 10))
+# fetchGameRecord carries the whole replay inline for older games, so give it more room
+RPC_METHOD_TIMEOUTS = {
+    'fetchGameRecord': float(os.environ.get('MJS_RECORD_TIMEOUT', 30)),
+}
+# every pool member logs in with the same account, check the server tolerates
+# concurrent sessions before raising this
+POOL_SIZE = int(os.environ.get('MJS_POOL_SIZE', 1))
+# how long a request waits for the pool to replace its channels before the
+# whole pool is rebuilt
+POOL_REPAIR_TIMEOUT = float(os.environ.get('MJS_POOL_REPAIR_TIMEOUT', 10))
+KEEPALIVE_INTERVAL = float(os.environ.get('MJS_KEEPALIVE_INTERVAL', 15))
+RECORD_CACHE_BYTES = int(os.environ.get('MJS_RECORD_CACHE_BYTES', 256 * 1024 * 1024))
+# set MJS_RECORD_STORE_PATH to an empty string to disable the on-disk store
+RECORD_STORE_PATH = os.environ.get('MJS_RECORD_STORE_PATH', 'records.sqlite3')
+RECORD_STORE_BYTES = int(os.environ.get('MJS_RECORD_STORE_BYTES', 1024 * 1024 * 1024))
+HTTP_POOL_SIZE = int(os.environ.get('MJS_HTTP_POOL_SIZE', 100))
+HTTP_POOL_SIZE_PER_HOST = int(os.environ.get('MJS_HTTP_POOL_SIZE_PER_HOST', 20))
+HTTP_TIMEOUT = float(os.environ.get('MJS_HTTP_TIMEOUT', 30))
+LIVE_POLL_INTERVAL = float(os.environ.get('MJS_LIVE_POLL_INTERVAL', 5))
+LIVE_TAIL_INTERVAL = float(os.environ.get('MJS_LIVE_TAIL_INTERVAL', 2))
+# base for relative GameLiveSegmentUri.segment_uri values
+LIVE_SEGMENT_URL = os.environ.get('MJS_LIVE_SEGMENT_URL', MS_HOST or '')
+LIVE_MODES = [int(mode) for mode in os.environ.get(
+    'MJS_LIVE_MODES', '216,215,225,226,224,223,212,211,208,209,221,222').split(',') if mode.strip()]
+HEADER_CACHE_BYTES = int(os.environ.get('MJS_HEADER_CACHE_BYTES', 32 * 1024 * 1024))
+HEADER_BATCH_SIZE = int(os.environ.get('MJS_HEADER_BATCH_SIZE', 100))
+HEADER_BATCH_WINDOW = float(os.environ.get('MJS_HEADER_BATCH_WINDOW', 0.01))
+CRAWL_CHECKPOINT = os.environ.get('MJS_CRAWL_CHECKPOINT', 'crawl_checkpoint.json')
+CRAWL_CONCURRENCY = int(os.environ.get('MJS_CRAWL_CONCURRENCY', 4))
+CRAWL_RATE = float(os.environ.get('MJS_CRAWL_RATE', 5))
+BATCH_CONCURRENCY = int(os.environ.get('MJS_BATCH_CONCURRENCY', 8))
+BATCH_MAX_UUIDS = int(os.environ.get('MJS_BATCH_MAX_UUIDS', 1000))
+# fetchGameRecord error codes answered with 404, any other error is a 502
+RECORD_NOT_FOUND_CODES = {int(code) for code in os.environ.get(
+    'MJS_RECORD_NOT_FOUND_CODES', '1203').split(',') if code.strip()}
+# render replay payloads with FastJSONResponse (orjson)
+FAST_JSON = os.environ.get('MJS_FAST_JSON', '').lower() in ('1', 'true', 'yes')
 
 app = FastAPI()
 
@@ -34,44 +83,210 @@ logged_in = False
 
 cache = {}
 
+# finished game records never change, so decoded replays are kept until
+# pushed out by newer ones
+record_cache = LRUCache(RECORD_CACHE_BYTES)
+
+# live lists change at most every few seconds, /live answers from the
+# latest background snapshot instead of asking the server every time
+async def load_live():
+    lobby = await ensure_login()
+    return await load_game_live_logs(lobby)
+
+live_poller = LivePoller(load_live, interval=LIVE_POLL_INTERVAL)
+
+# games in progress are tailed once and shared by every viewer
+async def create_live_tail(uuid):
+    # the tail asks for the lobby on every call, a reconnect replaces it
+    return LiveGameTail(ensure_login, uuid, download_live_segment, interval=LIVE_TAIL_INTERVAL)
+
+async def live_game_finished(uuid):
+    # hand over to the finished record cache, the record can take a moment
+    # to show up after the game ends
+    for attempt in range(3):
+        await asyncio.sleep(LIVE_TAIL_INTERVAL * (attempt + 1))
+        try:
+            await get_game_record(uuid)
+            return
+        except Exception as e:
+            logging.info("Finished live game {} ERROR: {}".format(uuid, e))
+
+live_games = LiveGameStore(create_live_tail, on_finished=live_game_finished)
+
+# concurrent requests for the same uuid share one fetch and decode
+record_fetches = Coalescer()
+# /record and /record/{uuid}/stream decode differently but share the
+# upstream fetch
+record_loads = Coalescer()
+
+# game headers (players, scores, times) looked up in fetchGameRecordsDetail
+# batches and cached separately from the full records
+header_cache = LRUCache(HEADER_CACHE_BYTES)
+
+async def fetch_game_heads(uuids):
+    lobby = await ensure_login()
+    req = pb.ReqGameRecordsDetail()
+    req.uuid_list.extend(uuids)
+    res = await lobby.fetch_game_records_detail(req)
+    if res.error.code != 0:
+        raise GameRecordError("fetchGameRecordsDetail error {}".format(res.error.code))
+    return cache_game_heads(res.record_list)
+
+def cache_game_heads(record_list):
+    heads = {}
+    for record in record_list:
+        heads[record.uuid] = message_to_dict(record)
+        header_cache.put(record.uuid, heads[record.uuid])
+    return heads
+
+header_batches = MicroBatcher(fetch_game_heads, max_batch=HEADER_BATCH_SIZE, window=HEADER_BATCH_WINDOW)
+
+# raw ResGameRecord payloads survive restarts so a fresh worker can serve
+# already seen games without logging in
+record_store = RecordStore(RECORD_STORE_PATH, RECORD_STORE_BYTES) if RECORD_STORE_PATH else None
+
+def http_session():
+    # one long-lived session for every outgoing HTTP call, so record downloads
+    # and config fetches reuse pooled keep-alive connections
+    session = cache.get("http")
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_SIZE,
+            limit_per_host=HTTP_POOL_SIZE_PER_HOST,
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT),
+        )
+        cache["http"] = session
+    return session
+
 @app.on_event("startup")
 async def startup_event():
-    lobby, channel = await connect()
-    await login(lobby, os.environ.get('CN_ACCOUNT_NAME'), os.environ.get('CN_ACCOUNT_PASS'))
+    pool = MSRPCChannelPool(connect_member, size=POOL_SIZE)
+    await pool.connect()
+
+    lobby = Lobby(pool)
+    lobby.version = pool.version
     cache["lobby"] = lobby
-    cache["channel"] = channel
+    cache["channel"] = pool
 
 
-async def ensure_login():
-    lobby = cache["lobby"]
-    channel = cache["channel"]
+@app.on_event("startup")
+async def start_background_tasks():
+    live_poller.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await live_poller.stop()
+    await live_games.close()
+    if "channel" in cache:
+        await cache["channel"].close()
+    if "http" in cache:
+        await cache.pop("http").close()
+    if record_store is not None:
+        record_store.close()
+
+
+async def connect_member():
+    lobby, channel = await connect()
     try:
-        heatbeat = pb.ResCommon()
-        res_heatbeat = await lobby.heatbeat(heatbeat)
-        if not res_heatbeat.error is None:
-            logging.info("HeatBeat ERROR: {}".format(res_heatbeat.error))
-
-        loginbeat = pb.ResCommon()
-        res_loginbeat = await lobby.heatbeat(loginbeat)
-        if not res_loginbeat.error is None:
-            logging.info("LoginBeat ERROR: {}".format(res_loginbeat.error))
-        
-    except Exception as e:
-        logging.info("Ensure_login ERROR: {}".format(e))
-        try:
-            if not channel is None:
-                await channel.close()
-        except Exception as AlreadyClosed:
-            pass
-        await startup_event()
-        return cache["lobby"]
-    
+        logged_in = await login(lobby, os.environ.get('CN_ACCOUNT_NAME'), os.environ.get('CN_ACCOUNT_PASS'))
+    except BaseException:
+        # timeouts and cancellation would otherwise leak the socket
+        await channel.close()
+        raise
+    if not logged_in:
+        await channel.close()
+        raise ConnectionError("Login failed")
+    return lobby, channel
+
+
+async def reconnect():
+    channel = cache.pop("channel", None)
+    try:
+        if not channel is None:
+            await channel.close()
+    except Exception as AlreadyClosed:
+        pass
+    await startup_event()
+
+reconnector = ReconnectCoordinator(
+    reconnect,
+    max_attempts=int(os.environ.get('MJS_RECONNECT_ATTEMPTS', 5)),
+)
+
+async def ensure_login():
+    # liveness is tracked by the channels' keepalive tasks, so this only
+    # reads a local flag instead of pinging the server on every request
+    channel = cache.get("channel")
+    if channel is not None and channel.stale and not reconnector.running:
+        # the pool replaces its own members, only rebuild it when that
+        # does not bring a channel back
+        logging.info("Channel is stale, repairing pool")
+        if await channel.repair(POOL_REPAIR_TIMEOUT):
+            return cache["lobby"]
+        # another request may have rebuilt it in the meantime
+        channel = cache.get("channel")
+    if channel is None or channel.stale:
+        logging.info("Channel is stale, reconnecting")
+        await reconnector.run()
+
     return cache["lobby"]
 
+@app.exception_handler(MSRPCTimeoutError)
+async def rpc_timeout_handler(request: Request, exc: MSRPCTimeoutError):
+    logging.info("RPC timeout: {}".format(exc))
+    return JSONResponse(status_code=504, content={"message": str(exc)})
+
+@app.exception_handler(GameRecordNotFound)
+async def record_not_found_handler(request: Request, exc: GameRecordNotFound):
+    return JSONResponse(status_code=404, content={"message": str(exc)})
+
+@app.exception_handler(GameRecordError)
+async def record_error_handler(request: Request, exc: GameRecordError):
+    logging.info("Game record error: {}".format(exc))
+    return JSONResponse(status_code=502, content={"message": str(exc)})
+
+@app.exception_handler(ConnectionError)
+async def connection_error_handler(request: Request, exc: ConnectionError):
+    logging.info("Connection error: {}".format(exc))
+    return JSONResponse(status_code=503, content={"message": str(exc)})
+
+def json_response(content, headers=None):
+    if FAST_JSON:
+        return FastJSONResponse(content, headers=headers)
+    if headers:
+        return JSONResponse(content, headers=headers)
+    return content
+
 @app.get("/")
 async def root():
     return {"message": "Hello world"}
 
+@app.get("/status")
+async def status():
+    channel = cache.get("channel")
+    return {
+        "reconnect": reconnector.status(),
+        "stale": channel is None or channel.stale,
+        "pool": None if channel is None else channel.stats(),
+        "record_cache": record_cache.stats(),
+        "record_fetches": record_fetches.stats(),
+        "record_loads": record_loads.stats(),
+        "header_cache": header_cache.stats(),
+        "header_batches": header_batches.stats(),
+        "record_store": None if record_store is None else record_store.stats(),
+        "live_games": live_games.stats(),
+        "live": None if live_poller.snapshot is None else {
+            "generation": live_poller.snapshot.generation,
+            "age": live_poller.age(),
+        },
+    }
+
 @app.get("/login")
 async def login():
     lobby = await ensure_login()
@@ -108,62 +323,247 @@ async def test():
 
     game_json =  await game_log_as_json(lobby, "210110-39822d27-fa68-4315-ad33-e60074c682e1")
 
-    return game_json 
+    return json_response(game_json)
 
 @app.get("/live")
 async def live():
-    lobby = cache["lobby"]
+    snapshot = live_poller.snapshot
+    if snapshot is None:
+        try:
+            snapshot = await asyncio.wait_for(live_poller.wait_for(), RPC_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="Live list not loaded yet")
+
+    # snapshots are shared between requests, build the response in a new dict
+    game_ids = dict(snapshot.games)
+    # failed modes are listed under "errors"
+    if snapshot.errors:
+        game_ids["errors"] = snapshot.errors
+
+    headers = {
+        "Age": str(int(live_poller.age())),
+        "X-Live-Generation": str(snapshot.generation),
+    }
+    return json_response(game_ids, headers=headers)
+
+@app.get("/live/stream")
+async def live_stream():
+    # server-sent events: one "snapshot" event with the full lists, then a
+    # "diff" event per refresh that added or removed games
+    return StreamingResponse(live_events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+def sse_event(event, generation, data):
+    return b"event: " + event.encode() + b"\nid: " + str(generation).encode() + b"\ndata: " + json_dumps(data) + b"\n\n"
+
+async def live_events():
+    snapshot = await live_poller.wait_for()
+    yield sse_event("snapshot", snapshot.generation, {"games": snapshot.games, "errors": snapshot.errors})
+
+    while True:
+        newer = await live_poller.wait_for(snapshot.generation)
+        changes = live_poller.changes_since(snapshot, newer)
+        if changes:
+            yield sse_event("diff", newer.generation, {"changes": changes, "errors": newer.errors})
+        else:
+            # comment line, keeps proxies from closing an idle stream
+            yield b": " + str(newer.generation).encode() + b"\n\n"
+        snapshot = newer
+
+@app.get("/live/{uuid}/stream")
+async def live_game_stream(uuid, offset: int = Query(0, ge=0)):
+    try:
+        game = await live_games.get(uuid)
+    except LiveGameError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
-    #game_log = await load_and_process_game_log(lobby, "210110-39822d27-fa68-4315-ad33-e60074c682e1")
-    #logging.info("game {} result : \n{}".format(game_log.head.uuid, game_log.head.result))
+    # newline delimited JSON: the live head, then one line per action from
+    # offset on as segments are published
+    return StreamingResponse(live_game_ndjson(game, offset), media_type="application/x-ndjson")
 
-    game_ids =  await load_game_live_logs(lobby)
+async def live_game_ndjson(game, offset):
+    yield json_dumps({"Game": game.head}) + b"\n"
+    async for index, segment_id, kind, data in live_games.subscribe(game, offset):
+        yield json_dumps({"offset": index, "segment": segment_id, "type": kind, "data": data}) + b"\n"
 
-    return game_ids 
+async def download_live_segment(uri):
+    url = uri if uri.startswith("http") else urljoin(LIVE_SEGMENT_URL, uri)
+    async with http_session().get(url) as response:
+        response.raise_for_status()
+        return await response.read()
 
 @app.get("/record/{uuid}")
 async def record(uuid):
-    lobby = await ensure_login()
-
     #game_log = await load_and_process_game_log(lobby, "210110-39822d27-fa68-4315-ad33-e60074c682e1")
     #logging.info("game {} result : \n{}".format(game_log.head.uuid, game_log.head.result))
 
-    game_json =  await game_log_as_json(lobby, uuid)
+    game_json =  await get_game_record(uuid)
 
-    return game_json 
+    return json_response(game_json)
+
+@app.get("/record/{uuid}/stream")
+async def record_stream(uuid):
+    # newline delimited JSON: the game header first, then one line per round
+    # as soon as it is decoded. The record is loaded before the response
+    # starts so fetch errors still get their status code.
+    game_json = record_cache.get(uuid)
+    if game_json is not None:
+        header = {k: v for k, v in game_json["Game"].items() if k != "Rounds"}
+        rounds = game_json["Game"]["Rounds"]
+    else:
+        res = await load_shared_game_record(uuid)
+        header = game_header(res)
+        rounds = iter_rounds(game_records(res.data))
+
+    return StreamingResponse(game_log_as_ndjson(header, rounds), media_type="application/x-ndjson")
+
+@app.post("/records")
+async def records(uuids: list[str], concurrency: int = BATCH_CONCURRENCY):
+    if len(uuids) > BATCH_MAX_UUIDS:
+        raise HTTPException(status_code=400, detail="At most {} uuids per request".format(BATCH_MAX_UUIDS))
+    concurrency = max(1, min(concurrency, BATCH_CONCURRENCY))
+
+    # newline delimited JSON, one line per uuid in completion order
+    return StreamingResponse(batch_game_records(uuids, concurrency), media_type="application/x-ndjson")
+
+async def batch_game_records(uuids, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(uuid):
+        async with semaphore:
+            try:
+                game_json = await get_game_record(uuid)
+            except Exception as e:
+                logging.info("Batch record {} ERROR: {}".format(uuid, e))
+                return {"uuid": uuid, "error": str(e) or type(e).__name__}
+        return {"uuid": uuid, **game_json}
+
+    tasks = [asyncio.create_task(fetch(uuid)) for uuid in dict.fromkeys(uuids)]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield json_dumps(await task) + b"\n"
+    finally:
+        # the client may disconnect mid-stream
+        for task in tasks:
+            task.cancel()
+
+@app.get("/record/{uuid}/head")
+async def record_head(uuid):
+    head = await get_game_head(uuid)
+    if head is None:
+        raise GameRecordNotFound("Game {} not found".format(uuid))
+    return json_response(head)
+
+@app.post("/heads")
+async def record_heads(uuids: list[str]):
+    if len(uuids) > BATCH_MAX_UUIDS:
+        raise HTTPException(status_code=400, detail="At most {} uuids per request".format(BATCH_MAX_UUIDS))
+    unique = list(dict.fromkeys(uuids))
+    heads = await asyncio.gather(*[get_game_head(uuid) for uuid in unique])
+    return json_response(dict(zip(unique, heads)))
+
+async def get_game_head(uuid):
+    head = header_cache.get(uuid)
+    if head is not None:
+        return head
+    return await header_batches.get(uuid)
+
+@app.post("/crawl")
+async def crawl(record_type: int = 0):
+    # fetchGameRecordList lists the games of the logged in account
+    task = cache.get("crawl")
+    if task is not None and not task.done():
+        raise HTTPException(status_code=409, detail="A crawl is already running")
+
+    # fail early when there is no connection, the crawler itself looks the
+    # lobby up on every call so it survives reconnects
+    await ensure_login()
+    crawler = RecordListCrawler(
+        ensure_login,
+        lambda uuid: load_game_record(None, uuid),
+        CRAWL_CHECKPOINT,
+        record_type=record_type,
+        concurrency=CRAWL_CONCURRENCY,
+        rate=CRAWL_RATE,
+        on_headers=cache_game_heads,
+    )
+    task = asyncio.create_task(crawler.run())
+    task.add_done_callback(log_crawl_result)
+    cache["crawler"] = crawler
+    cache["crawl"] = task
+
+    return crawler.stats()
+
+@app.get("/crawl")
+async def crawl_status():
+    crawler = cache.get("crawler")
+    if crawler is None:
+        return {"state": "idle"}
+    return crawler.stats()
+
+def log_crawl_result(task):
+    if task.cancelled():
+        return
+    if task.exception() is not None:
+        logging.info("Crawl ERROR: {}".format(task.exception()))
+    else:
+        logging.info("Crawl finished: {}".format(task.result()))
+
+async def get_game_record(uuid):
+    game_json = record_cache.get(uuid)
+    if game_json is not None:
+        return game_json
+
+    return await record_fetches.run(uuid, lambda: fetch_and_cache_game_record(uuid))
+
+async def fetch_and_cache_game_record(uuid):
+    # errors raise before this point, an empty game is not worth keeping
+    # either, the record may still be written on the server side
+    logging.info("Loading game log")
+    game_json = game_record_as_json(await load_shared_game_record(uuid))
+    if game_json["Game"]["Rounds"]:
+        record_cache.put(uuid, game_json)
+
+    return game_json
+
+async def load_shared_game_record(uuid):
+    return await record_loads.run(uuid, lambda: load_game_record(None, uuid))
 
 async def connect():
-    async with aiohttp.ClientSession() as session:
-        async with session.get("{}/1/version.json".format(MS_HOST)) as res:
-            version = await res.json()
-            logging.info(f"Version: {version}")
+    session = http_session()
+    async with session.get("{}/1/version.json".format(MS_HOST)) as res:
+        version = await res.json()
+        logging.info(f"Version: {version}")
 
-            version = version["version"]
+        version = version["version"]
 
-        async with session.get("{}/1/v{}/config.json".format(MS_HOST, version)) as res:
-            config = await res.json()
-            logging.info(f"Config: {config}")
+    async with session.get("{}/1/v{}/config.json".format(MS_HOST, version)) as res:
+        config = await res.json()
+        logging.info(f"Config: {config}")
 
-            # TODO: add logic to check for region_url list as well, and shuffle logic across the returns routes/gateways. Example here: https://github.com/SAPikachu/amae-koromo-scripts/blob/master/majsoul.js
+        # TODO: add logic to check for region_url list as well, and shuffle logic across the returns routes/gateways. Example here: https://github.com/SAPikachu/amae-koromo-scripts/blob/master/majsoul.js
 
-            url = str(config["ip"][0]["gateways"][1]['url'])
-            logging.info(f"Selected route: {url}")
-            url = url.replace("https://", "")
-            endpoint = "wss://{}/gateway".format(url)
-            logging.info(f"Selected endpoint: {endpoint}")
-            #url = str(config["ip"][0]["region_urls"][1]['url'])
+        url = str(config["ip"][0]["gateways"][1]['url'])
+        logging.info(f"Selected route: {url}")
+        # plain http routes only come from a local stand-in gateway
+        scheme = "ws" if url.startswith("http://") else "wss"
+        url = url.replace("https://", "").replace("http://", "")
+        endpoint = "{}://{}/gateway".format(scheme, url)
+        logging.info(f"Selected endpoint: {endpoint}")
+        #url = str(config["ip"][0]["region_urls"][1]['url'])
 
-        # async with session.get(url + "?service=ws-gateway&protocol=ws&ssl=true") as res:
-        #     servers = await res.json()
-        #     logging.info(f"Available servers: {servers}")
+    # async with session.get(url + "?service=ws-gateway&protocol=ws&ssl=true") as res:
+    #     servers = await res.json()
+    #     logging.info(f"Available servers: {servers}")
 
-        #     servers = servers["servers"]
-        #     server = random.choice(servers)
-        #     #endpoint = 'wss://gateway-hw.maj-soul.com/gateway' # /gateway' #"wss://{}/".format(server)
-        #     endpoint = "wss://{}/gateway".format(server)
+    #     servers = servers["servers"]
+    #     server = random.choice(servers)
+    #     #endpoint = 'wss://gateway-hw.maj-soul.com/gateway' # /gateway' #"wss://{}/".format(server)
+    #     endpoint = "wss://{}/gateway".format(server)
 
     logging.info(f"Chosen endpoint: {endpoint}")
-    channel = MSRPCChannel(endpoint)
+    channel = MSRPCChannel(endpoint, timeout=RPC_TIMEOUT, method_timeouts=RPC_METHOD_TIMEOUTS,
+                           keepalive_interval=KEEPALIVE_INTERVAL)
 
     lobby = Lobby(channel)
     lobby.version = version
@@ -213,24 +613,32 @@ async def load_game_logs(lobby):
 
     return records
 
-async def load_game_live_logs(lobby):
-    logging.info("Loading live game logs")
+async def load_game_live_list(lobby, mode):
+    req = pb.ReqGameLiveList()
+    req.filter_id = mode
 
-    modes =  [216, 215, 225, 226, 224, 223, 212, 211, 208, 209, 221, 222]
-    game_ids = {}
+    res = await lobby.fetch_game_live_list(req)
+    if res.error.code != 0:
+        raise GameRecordError("fetchGameLiveList error {}".format(res.error.code))
 
-    for mode in modes:
-        req = pb.ReqGameLiveList()
-        req.filter_id = mode
+    return [message_to_dict(r) for r in res.live_list]
 
-        res = await lobby.fetch_game_live_list(req)
-        #game_ids.extend([r.uuid for r in res.live_list])
-        #game_ids.extend(res.live_list)
-        game_ids[mode] = [MessageToDict(r) for r in res.live_list]
-        #for r in res.live_list
-        
+async def load_game_live_logs(lobby, modes=LIVE_MODES):
+    logging.info("Loading live game logs")
 
-    return game_ids
+    results = await asyncio.gather(*[load_game_live_list(lobby, mode) for mode in modes], return_exceptions=True)
+
+    # a failing mode should not hide the others, report it next to them
+    game_ids = {}
+    errors = {}
+    for mode, result in zip(modes, results):
+        if isinstance(result, BaseException):
+            logging.info("Live list {} ERROR: {}".format(mode, result))
+            errors[mode] = str(result) or type(result).__name__
+        else:
+            game_ids[mode] = result
+
+    return game_ids, errors
 
 async def load_and_process_game_log(lobby, uuid):
     logging.info("Loading game log")
@@ -287,111 +695,68 @@ async def load_and_process_game_log(lobby, uuid):
 
     return res
 
-async def game_log_as_json(lobby, uuid):
-    logging.info("Loading game log")
-
-    jsonOutput = {}
-
+async def fetch_game_record(lobby, uuid):
     req = pb.ReqGameRecord()
     req.game_uuid = uuid
     req.client_version_string = f"web-{lobby.version.replace('.w', '')}"
     res = await lobby.fetch_game_record(req)
+    if res.error.code in RECORD_NOT_FOUND_CODES:
+        raise GameRecordNotFound("Game {} not found".format(uuid))
+    if res.error.code != 0:
+        raise GameRecordError("fetchGameRecord error {} for {}".format(res.error.code, uuid))
 
-    record_wrapper = pb.Wrapper()
-
+    # newer games only carry a link to the record, inline it so callers and
+    # the record store always see the payload in res.data
     if res.data_url != "":
-        async with aiohttp.ClientSession() as session:
-            headers = {'content-type': 'text/html; charset=UTF-8'}
-            async with session.get(res.data_url, headers=headers) as response:
-                bData = await response.read()
-        
-        record_wrapper.ParseFromString(bData)
+        headers = {'content-type': 'text/html; charset=UTF-8'}
+        try:
+            async with http_session().get(res.data_url, headers=headers) as response:
+                response.raise_for_status()
+                res.data = await response.read()
+        except aiohttp.ClientError as e:
+            raise GameRecordError("Record download for {} failed: {}".format(uuid, e)) from e
+
+    # make sure the payload parses before anyone caches or stores it, an
+    # error page must not end up in the record store
+    try:
+        game_records(res.data)
+    except DecodeError as e:
+        raise GameRecordError("Record {} does not decode: {}".format(uuid, e)) from e
 
-    else:
-        record_wrapper.ParseFromString(res.data)
-        
-    game_details = pb.GameDetailRecords()
-    game_details.ParseFromString(record_wrapper.data)
+    return res
 
-    records = []
+async def load_game_record(lobby, uuid):
+    if record_store is not None:
+        data = await record_store.get(uuid)
+        if data is not None:
+            res = pb.ResGameRecord()
+            res.ParseFromString(data)
+            return res
 
-    if len(game_details.records) != 0:
-        records = game_details.records
-    elif len(game_details.actions) != 0:
-        records = [action.result for action in game_details.actions if len(action.result) > 0]
+    # the lobby is only needed when the record is not stored yet
+    if lobby is None:
+        lobby = await ensure_login()
+    res = await fetch_game_record(lobby, uuid)
 
-    game_records_count = len(records)
-    round_record_wrapper = pb.Wrapper()
+    if record_store is not None and len(res.data) > 0:
+        await record_store.put(uuid, res.SerializeToString())
 
-    jsonOutput["Game"] = MessageToDict(res)["head"]
-    jsonOutput["Game"]["Data_Url"] = res.data_url
-    jsonOutput["Game"]["Rounds"] = []
+    return res
 
-    round = -1
+async def game_log_as_json(lobby, uuid):
+    logging.info("Loading game log")
 
-    for i in range(0, game_records_count):
-        round_record_wrapper.ParseFromString(records[i])
+    res = await load_game_record(lobby, uuid)
 
-        if round_record_wrapper.name == ".lq.RecordNewRound":
-            round += 1
-            round_data = pb.RecordNewRound()
-            round_data.ParseFromString(round_record_wrapper.data)
-            jsonOutput["Game"]["Rounds"].append(MessageToDict(round_data))
-            jsonOutput["Game"]["Rounds"][round]["Tile"] = []
+    return game_record_as_json(res)
 
-        elif round_record_wrapper.name == ".lq.RecordDiscardTile":
-            discard_tile = pb.RecordDiscardTile()
-            discard_tile.ParseFromString(round_record_wrapper.data)
-            newTile = MessageToDict(discard_tile)
-            newTile["TileType"]  = "Discard"
-            jsonOutput["Game"]["Rounds"][round]["Tile"].append(newTile)
+# Holds one round at a time, the record cache is filled by /record
+async def game_log_as_ndjson(header, rounds):
+    logging.info("Streaming game log")
 
-        elif round_record_wrapper.name == ".lq.RecordDealTile":
-            deal_tile = pb.RecordDealTile()
-            deal_tile.ParseFromString(round_record_wrapper.data)
-            newTile = MessageToDict(deal_tile)
-            newTile["TileType"] = "Draw"
-            jsonOutput["Game"]["Rounds"][round]["Tile"].append(newTile)
-
-        elif round_record_wrapper.name == ".lq.RecordChiPengGang":
-            call_tile = pb.RecordChiPengGang()
-            call_tile.ParseFromString(round_record_wrapper.data)
-            newTile = MessageToDict(call_tile)
-            newTile["TileType"]  = "Call"
-            jsonOutput["Game"]["Rounds"][round]["Tile"].append(newTile)
-        
-        elif round_record_wrapper.name == ".lq.RecordBaBei":
-            call_pei = pb.RecordBaBei()
-            call_pei.ParseFromString(round_record_wrapper.data)
-            newTile = MessageToDict(call_pei)
-            newTile["TileType"]  = "Pei"
-            jsonOutput["Game"]["Rounds"][round]["Tile"].append(newTile)
-        
-        elif round_record_wrapper.name == ".lq.RecordAnGangAddGang":
-            add_to_kan = pb.RecordAnGangAddGang()
-            add_to_kan.ParseFromString(round_record_wrapper.data)
-            newTile = MessageToDict(add_to_kan)
-            if newTile["type"] == 2:
-                newTile["TileType"]  = "AddKan"
-            elif newTile["type"] == 3:
-                newTile["TileType"]  = "AnKan"
-
-            newTile["tile"]  = newTile["tiles"]
-            newTile.pop('tiles', None)
-            newTile.pop('type', None)
-            jsonOutput["Game"]["Rounds"][round]["Tile"].append(newTile)
-             
-        elif round_record_wrapper.name == ".lq.RecordHule":
-            # data = bytearray(round_record_wrapper.data, "utf-8")
-            round_result = pb.RecordHuleInfo()
-            # round_result.ParseFromString(round_record_wrapper.data)
-            # round_result.ParseFromString((round_record_wrapper.data).encode('utf-8').strip())
-            # jsonOutput[f"RoundResult{i}"] = MessageToDict(round_result)
-
-        #else:
-        #    jsonOutput["Game"]["Rounds"][round]["Tile"].append(round_record_wrapper.name)
-
-    return jsonOutput
+    yield json_dumps(header) + b"\n"
+    for round in rounds:
+        yield json_dumps(round) + b"\n"
 
 def print_data_as_json(data, type):
     json = MessageToJson(data)
@@ -399,4 +764,4 @@ def print_data_as_json(data, type):
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get('MJS_PORT', 8000)))
\ No newline at end of file
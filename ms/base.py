@@ -1,26 +1,77 @@
 import asyncio
+import logging
 import websockets
 
 from ms.protocol_pb2 import Wrapper
 
 
+DEFAULT_TIMEOUT = 10.0
+MAX_REQ_IDX = 60007
+KEEPALIVE_INTERVAL = 15.0
+KEEPALIVE_METHOD = '.lq.Lobby.heatbeat'
+
+
+class MSRPCTimeoutError(Exception):
+
+    def __init__(self, name, timeout):
+        super().__init__('{} timed out after {}s'.format(name, timeout))
+        self.name = name
+        self.timeout = timeout
+
+
 class MSRPCChannel:
 
-    def __init__(self, endpoint):
+    def __init__(self, endpoint, timeout=DEFAULT_TIMEOUT, method_timeouts=None, keepalive_interval=KEEPALIVE_INTERVAL):
         self._endpoint = endpoint
-        self._req_events = {}
+        # request index -> future resolved with the unwrapped response payload
+        self._pending = {}
         self._new_req_idx = 1
-        self._res = {}
         self._hooks = {}
 
+        # method_timeouts is keyed by either the full RPC name
+        # ('.lq.Lobby.fetchGameRecord') or the bare method name ('fetchGameRecord')
+        self._timeout = timeout
+        self._method_timeouts = dict(method_timeouts or {})
+
+        # the keepalive task only pings when nothing was received for a whole
+        # interval, and flags the channel stale when the ping fails
+        self._keepalive_interval = keepalive_interval
+        self._last_recv = None
+        self._stale = False
+
         self._ws = None
         self._msg_dispatcher = None
+        self._keepalive = None
 
     def add_hook(self, msg_type, hook):
         if msg_type not in self._hooks:
             self._hooks[msg_type] = []
         self._hooks[msg_type].append(hook)
 
+    @property
+    def in_flight(self):
+        return len(self._pending)
+
+    @property
+    def is_open(self):
+        return self._msg_dispatcher is not None and not self._msg_dispatcher.done()
+
+    @property
+    def stale(self):
+        return self._stale or not self.is_open
+
+    @property
+    def last_recv(self):
+        return self._last_recv
+
+    def set_timeout(self, method, timeout):
+        self._method_timeouts[method] = timeout
+
+    def get_timeout(self, name):
+        if name in self._method_timeouts:
+            return self._method_timeouts[name]
+        return self._method_timeouts.get(name.rsplit('.', 1)[-1], self._timeout)
+
     def unwrap(self, wrapped):
         wrapper = Wrapper()
         wrapper.ParseFromString(wrapped)
@@ -34,60 +85,109 @@ class MSRPCChannel:
 
     async def connect(self, ms_host):
         self._ws = await websockets.connect(self._endpoint, origin=ms_host)
+        self._last_recv = asyncio.get_running_loop().time()
+        self._stale = False
         self._msg_dispatcher = asyncio.create_task(self.dispatch_msg())
+        if self._keepalive_interval:
+            self._keepalive = asyncio.create_task(self.keepalive())
 
     async def close(self):
+        if self._keepalive is not None:
+            self._keepalive.cancel()
         self._msg_dispatcher.cancel()
         try:
             await self._msg_dispatcher
-        except asyncio.CancelledError:
+        except (asyncio.CancelledError, Exception):
             pass
         finally:
             await self._ws.close()
+            self._fail_pending(ConnectionError('channel closed'))
 
-    async def dispatch_msg(self):
+    def _fail_pending(self, exc):
+        for fut in self._pending.values():
+            if not fut.done():
+                fut.set_exception(exc)
+
+    async def keepalive(self):
+        loop = asyncio.get_running_loop()
         while True:
-            msg = await self._ws.recv()
-            type_byte = msg[0]
-            if type_byte == 1:  # NOTIFY
-                wrapper = self.unwrap(msg[1:])
-                for hook in self._hooks.get(wrapper.name, []):
-                    asyncio.create_task(hook(wrapper.data))
-            elif type_byte == 2:  # REQUEST
-                wrapper = self.unwrap(msg[3:])
-                for hook in self._hooks.get(wrapper.name, []):
-                    asyncio.create_task(hook(wrapper.data))
-            elif type_byte == 3:  # RESPONSE
-                idx = int.from_bytes(msg[1:3], 'little')
-                if not idx in self._req_events:
-                    continue
-                self._res[idx] = msg
-                self._req_events[idx].set()
-
-    async def send_request(self, name, msg):
-        idx = self._new_req_idx
-        self._new_req_idx = (self._new_req_idx + 1) % 60007
+            idle = loop.time() - self._last_recv
+            if idle < self._keepalive_interval:
+                await asyncio.sleep(self._keepalive_interval - idle)
+                continue
+            try:
+                await self.send_request(KEEPALIVE_METHOD, b'')
+            except Exception as e:
+                logging.info("Keepalive ERROR: {}".format(e))
+                self._stale = True
+                return
 
-        wrapped = self.wrap(name, msg)
-        pkt = b'\x02' + idx.to_bytes(2, 'little') + wrapped
+    async def dispatch_msg(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                msg = await self._ws.recv()
+                self._last_recv = loop.time()
+                type_byte = msg[0]
+                if type_byte == 1:  # NOTIFY
+                    wrapper = self.unwrap(msg[1:])
+                    for hook in self._hooks.get(wrapper.name, []):
+                        asyncio.create_task(hook(wrapper.data))
+                elif type_byte == 2:  # REQUEST
+                    wrapper = self.unwrap(msg[3:])
+                    for hook in self._hooks.get(wrapper.name, []):
+                        asyncio.create_task(hook(wrapper.data))
+                elif type_byte == 3:  # RESPONSE
+                    idx = int.from_bytes(msg[1:3], 'little')
+                    fut = self._pending.get(idx)
+                    if fut is None or fut.done():
+                        continue
+                    fut.set_result(self.unwrap(msg[3:]).data)
+        except websockets.ConnectionClosed as e:
+            logging.info("Channel closed by server: {}".format(e))
+        except Exception as e:
+            logging.exception("Dispatcher ERROR: {}".format(e))
+        finally:
+            # nobody will answer the requests still waiting, fail them now
+            # instead of letting each one run into its timeout
+            self._fail_pending(ConnectionError('channel closed'))
+
+    def _next_req_idx(self):
+        if len(self._pending) >= MAX_REQ_IDX:
+            raise RuntimeError('no free request index, {} requests in flight'.format(len(self._pending)))
+        # skip indices that still belong to an in-flight request
+        idx = self._new_req_idx
+        while idx in self._pending:
+            idx = (idx + 1) % MAX_REQ_IDX
+        self._new_req_idx = (idx + 1) % MAX_REQ_IDX
+        return idx
 
-        evt = asyncio.Event()
-        self._req_events[idx] = evt
+    async def send_request(self, name, msg, timeout=None):
+        if timeout is None:
+            timeout = self.get_timeout(name)
 
-        await self._ws.send(pkt)
-        await evt.wait()
+        if not self.is_open:
+            raise ConnectionError('channel closed')
 
-        if not idx in self._res:
-            return None
-        res = self._res[idx]
-        del self._res[idx]
+        idx = self._next_req_idx()
 
-        if idx in self._req_events:
-            del self._req_events[idx]
+        wrapped = self.wrap(name, msg)
+        pkt = b'\x02' + idx.to_bytes(2, 'little') + wrapped
 
-        body = self.unwrap(res[3:])
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[idx] = fut
 
-        return body.data
+        try:
+            await self._ws.send(pkt)
+            return await asyncio.wait_for(fut, timeout)
+        except websockets.ConnectionClosed as e:
+            raise ConnectionError('channel closed: {}'.format(e)) from None
+        except asyncio.TimeoutError:
+            raise MSRPCTimeoutError(name, timeout) from None
+        finally:
+            # drop the bookkeeping on every exit path, including cancellation,
+            # so a lost response cannot leak an entry
+            self._pending.pop(idx, None)
 
 
 class MSRPCService:
@@ -107,10 +207,10 @@ class MSRPCService:
     def get_res_class(self, method):
         raise NotImplementedError
 
-    async def call_method(self, method, req):
+    async def call_method(self, method, req, timeout=None):
         msg = req.SerializeToString()
         name = '.{}.{}.{}'.format(self.get_package_name(), self.get_service_name(), method)
-        res_msg = await self._channel.send_request(name, msg)
+        res_msg = await self._channel.send_request(name, msg, timeout=timeout)
         res_class = self.get_res_class(method)
         res = res_class()
         res.ParseFromString(res_msg)
@@ -0,0 +1,175 @@
+import asyncio
+import json
+from collections import OrderedDict
+
+
+def json_size(value):
+    return len(json.dumps(value, separators=(',', ':')))
+
+
+# LRU cache bounded by the total size of its values rather than their count.
+# sizeof is called once per put and its result is kept with the entry.
+class LRUCache:
+
+    def __init__(self, max_bytes, sizeof=json_size):
+        self._max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_bytes': self._max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value):
+        size = self._sizeof(value)
+        if size > self._max_bytes:
+            return False
+
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while self._bytes > self._max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+        return True
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+
+# Deduplicates concurrent calls for the same key: the first caller starts
+# the work and everyone arriving before it finishes awaits the same task.
+class Coalescer:
+
+    def __init__(self):
+        self._tasks = {}
+
+        self.calls = 0
+        self.coalesced = 0
+
+    @property
+    def in_flight(self):
+        return len(self._tasks)
+
+    def stats(self):
+        return {
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._tasks),
+        }
+
+    async def run(self, key, factory):
+        self.calls += 1
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.create_task(factory())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield so one caller going away does not cancel the shared fetch
+        return await asyncio.shield(task)
+
+
+# Groups keys requested within a short window into one call of
+# fetch_batch(keys), which returns a dict of the values found. Each caller
+# gets the value for its own key, None when the batch did not return it.
+class MicroBatcher:
+
+    def __init__(self, fetch_batch, max_batch=100, window=0.01):
+        self._fetch_batch = fetch_batch
+        self._max_batch = max_batch
+        self._window = window
+
+        self._pending = {}
+        self._in_flight = {}
+        self._timer = None
+        # the event loop only keeps weak references to tasks
+        self._tasks = set()
+
+        self.calls = 0
+        self.batches = 0
+
+    def stats(self):
+        return {
+            'calls': self.calls,
+            'batches': self.batches,
+            'pending': len(self._pending),
+            'in_flight': len(self._in_flight),
+        }
+
+    async def get(self, key):
+        self.calls += 1
+        # a key already waiting or in a batch being fetched is not sent twice
+        fut = self._pending.get(key) or self._in_flight.get(key)
+        if fut is None:
+            fut = asyncio.get_running_loop().create_future()
+            self._pending[key] = fut
+            if len(self._pending) >= self._max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(self._window, self._flush)
+        return await asyncio.shield(fut)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            self.batches += 1
+            self._in_flight.update(batch)
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        values = None
+        error = None
+        try:
+            values = await self._fetch_batch(list(batch))
+        except Exception as e:
+            error = e
+        finally:
+            # also on cancellation, no caller may be left waiting
+            if values is None and error is None:
+                error = RuntimeError('batch was cancelled')
+            for key, fut in batch.items():
+                self._in_flight.pop(key, None)
+                if fut.done():
+                    continue
+                if error is not None:
+                    fut.set_exception(error)
+                else:
+                    fut.set_result(values.get(key))
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import logging
+import math
+import os
+
+import ms.protocol_pb2 as pb
+from ms.records import GameRecordError
+
+
+# Token bucket shared by every request a crawl makes.
+class RateLimiter:
+
+    def __init__(self, rate, burst=1):
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._updated = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self._updated is not None:
+                    self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+# Walks every page of fetchGameRecordList, looks the new uuids up in
+# fetchGameRecordsDetail batches and hands each one to fetch_record (which
+# puts it into the record store). Progress is written to a JSON checkpoint
+# so an interrupted crawl resumes without fetching the same records again.
+# get_lobby is a coroutine function returning the current lobby, a reconnect
+# during a long crawl replaces it.
+class RecordListCrawler:
+
+    def __init__(self, get_lobby, fetch_record, checkpoint_path, record_type=0, page_size=30,
+                 detail_batch=50, concurrency=4, rate=5.0, on_headers=None):
+        self._get_lobby = get_lobby
+        self._fetch_record = fetch_record
+        self._checkpoint_path = checkpoint_path
+        self._record_type = record_type
+        self._page_size = page_size
+        self._detail_batch = detail_batch
+        self._concurrency = concurrency
+        self._limiter = RateLimiter(rate, burst=concurrency)
+        self._on_headers = on_headers
+
+        self.total_count = 0
+        self.pages_done = set()
+        self.listed = []
+        self.processed = set()
+        self.failed = {}
+        self.state = 'idle'
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'total_count': self.total_count,
+            'pages': math.ceil(self.total_count / self._page_size) if self.total_count else 0,
+            'pages_done': len(self.pages_done),
+            'listed': len(self.listed),
+            'processed': len(self.processed),
+            'failed': len(self.failed),
+        }
+
+    def load_checkpoint(self):
+        if not self._checkpoint_path or not os.path.exists(self._checkpoint_path):
+            return
+        with open(self._checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('type') != self._record_type:
+            return
+        self.total_count = checkpoint['total_count']
+        self.pages_done = set(checkpoint['pages_done'])
+        self.listed = checkpoint['listed']
+        self.processed = set(checkpoint['processed'])
+
+    def save_checkpoint(self):
+        if not self._checkpoint_path:
+            return
+        checkpoint = {
+            'type': self._record_type,
+            'total_count': self.total_count,
+            'pages_done': sorted(self.pages_done),
+            'listed': self.listed,
+            'processed': sorted(self.processed),
+        }
+        tmp_path = self._checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self._checkpoint_path)
+
+    async def _call(self, method, req):
+        await self._limiter.acquire()
+        lobby = await self._get_lobby()
+        res = await getattr(lobby, method)(req)
+        if res.error.code != 0:
+            raise GameRecordError("{} error {}".format(type(req).__name__, res.error.code))
+        return res
+
+    async def _fetch_page(self, start):
+        req = pb.ReqGameRecordList()
+        req.start = start
+        req.count = self._page_size
+        req.type = self._record_type
+        return await self._call('fetch_game_record_list', req)
+
+    def _add_listed(self, record_list):
+        known = set(self.listed)
+        for record in record_list:
+            if record.uuid not in known:
+                known.add(record.uuid)
+                self.listed.append(record.uuid)
+
+    async def _list(self):
+        self.state = 'listing'
+        first = await self._fetch_page(1)
+        if first.total_count != self.total_count:
+            # new games shift every page, list them all again; records
+            # already processed are still skipped below
+            self.total_count = first.total_count
+            self.pages_done = set()
+        self._add_listed(first.record_list)
+        self.pages_done.add(1)
+
+        starts = [start for start in range(1, self.total_count + 1, self._page_size) if start not in self.pages_done]
+        semaphore = asyncio.Semaphore(self._concurrency)
+
+        async def fetch(start):
+            async with semaphore:
+                res = await self._fetch_page(start)
+            self._add_listed(res.record_list)
+            self.pages_done.add(start)
+
+        results = await asyncio.gather(*[fetch(start) for start in starts], return_exceptions=True)
+        for start, result in zip(starts, results):
+            if isinstance(result, Exception):
+                logging.info("Crawl page {} ERROR: {}".format(start, result))
+        self.save_checkpoint()
+
+    async def _process(self):
+        self.state = 'fetching'
+        pending = [uuid for uuid in self.listed if uuid not in self.processed]
+        semaphore = asyncio.Semaphore(self._concurrency)
+
+        async def fetch(uuid):
+            async with semaphore:
+                await self._limiter.acquire()
+                try:
+                    await self._fetch_record(uuid)
+                except Exception as e:
+                    logging.info("Crawl record {} ERROR: {}".format(uuid, e))
+                    self.failed[uuid] = str(e) or type(e).__name__
+                    return
+            self.processed.add(uuid)
+            self.failed.pop(uuid, None)
+
+        for i in range(0, len(pending), self._detail_batch):
+            batch = pending[i:i + self._detail_batch]
+
+            req = pb.ReqGameRecordsDetail()
+            req.uuid_list.extend(batch)
+            try:
+                res = await self._call('fetch_game_records_detail', req)
+                if self._on_headers is not None:
+                    self._on_headers(res.record_list)
+            except Exception as e:
+                logging.info("Crawl detail batch ERROR: {}".format(e))
+
+            await asyncio.gather(*[fetch(uuid) for uuid in batch])
+            self.save_checkpoint()
+
+    async def run(self):
+        self.load_checkpoint()
+        try:
+            await self._list()
+            await self._process()
+        except Exception:
+            self.state = 'failed'
+            self.save_checkpoint()
+            raise
+        self.state = 'done'
+        return self.stats()
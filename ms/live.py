@@ -0,0 +1,350 @@
+import asyncio
+import logging
+import time
+from collections import namedtuple
+
+import ms.protocol_pb2 as pb
+from ms.records import live_segment_actions, message_to_dict
+
+
+# games maps mode -> list of live game heads, errors maps mode -> message for
+# the modes whose last refresh failed and changes holds the diff against the
+# previous generation. Snapshots are replaced, never mutated.
+LiveSnapshot = namedtuple('LiveSnapshot', ['generation', 'created', 'games', 'errors', 'changes'])
+
+
+# Returns {mode: {"added": [heads], "removed": [uuids]}} for the modes whose
+# games differ between the two snapshots, matching heads by uuid.
+def diff_games(old, new):
+    changes = {}
+    for mode in old.keys() | new.keys():
+        old_heads = old.get(mode, [])
+        new_heads = new.get(mode, [])
+        old_uuids = {head.get("uuid") for head in old_heads}
+        new_uuids = {head.get("uuid") for head in new_heads}
+
+        added = [head for head in new_heads if head.get("uuid") not in old_uuids]
+        removed = [head.get("uuid") for head in old_heads if head.get("uuid") not in new_uuids]
+        if added or removed:
+            changes[mode] = {"added": added, "removed": removed}
+    return changes
+
+
+# Refreshes the live game lists on a fixed interval in the background so
+# requests can be answered from the latest snapshot without touching the
+# server. load is a coroutine function returning (games, errors).
+class LivePoller:
+
+    def __init__(self, load, interval=5.0):
+        self._load = load
+        self._interval = interval
+
+        self._snapshot = None
+        self._updated = asyncio.Condition()
+        self._task = None
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def age(self):
+        if self._snapshot is None:
+            return None
+        return time.time() - self._snapshot.created
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def wait_for(self, generation=0):
+        # returns the first snapshot newer than generation
+        async with self._updated:
+            await self._updated.wait_for(
+                lambda: self._snapshot is not None and self._snapshot.generation > generation)
+            return self._snapshot
+
+    def changes_since(self, snapshot, newer):
+        # the diff is computed once per refresh, only clients that skipped a
+        # generation need their own
+        if newer.generation == snapshot.generation + 1:
+            return newer.changes
+        return diff_games(snapshot.games, newer.games)
+
+    async def refresh(self):
+        games, errors = await self._load()
+
+        previous = self._snapshot
+        if previous is not None:
+            # keep serving the last known list for modes that failed this time
+            for mode in errors:
+                if mode in previous.games:
+                    games[mode] = previous.games[mode]
+
+        if previous is None:
+            generation = 1
+            changes = diff_games({}, games)
+        else:
+            generation = previous.generation + 1
+            changes = diff_games(previous.games, games)
+        snapshot = LiveSnapshot(generation, time.time(), games, errors, changes)
+        async with self._updated:
+            self._snapshot = snapshot
+            self._updated.notify_all()
+        return snapshot
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logging.info("Live refresh ERROR: {}".format(e))
+            await asyncio.sleep(self._interval)
+
+
+class LiveGameError(Exception):
+    pass
+
+
+# Follows one game in progress. start() loads the live head and the segments
+# published so far, segments() then yields (segment_id, actions) for every
+# segment in order, polling fetchGameLiveLeftSegment for ones published after
+# the last seen id until the server stops serving the game. get_lobby is a
+# coroutine function returning the current lobby, so a reconnect in between
+# is picked up, and download is a coroutine function fetching a segment_uri.
+#
+# Failed polls and downloads are retried with backoff, only an error code
+# from fetchGameLiveLeftSegment ends the game. A segment that still fails
+# after max_attempts downloads is skipped.
+class LiveGameTail:
+
+    def __init__(self, get_lobby, uuid, download, interval=2.0, max_delay=30.0, max_attempts=5):
+        self._get_lobby = get_lobby
+        self._uuid = uuid
+        self._download = download
+        self._interval = interval
+        self._max_delay = max_delay
+        self._max_attempts = max_attempts
+
+        self._pending = []
+        self._seen = set()
+        self.head = None
+        self.last_segment_id = 0
+        self.finished = False
+
+    async def start(self):
+        req = pb.ReqGameLiveInfo()
+        req.game_uuid = self._uuid
+        lobby = await self._get_lobby()
+        res = await lobby.fetch_game_live_info(req)
+        if res.error.code != 0:
+            raise LiveGameError("fetchGameLiveInfo error {} for {}".format(res.error.code, self._uuid))
+
+        self.head = message_to_dict(res.live_head)
+        self._queue(res.segments)
+        return self.head
+
+    def _queue(self, segments):
+        for segment in segments:
+            if segment.segment_id not in self._seen:
+                self._seen.add(segment.segment_id)
+                self._pending.append(segment)
+        self._pending.sort(key=lambda segment: segment.segment_id)
+
+    def _backoff(self, failures):
+        return min(self._max_delay, self._interval * 2 ** (failures - 1))
+
+    async def _poll(self):
+        req = pb.ReqGameLiveLeftSegment()
+        req.game_uuid = self._uuid
+        req.last_segment_id = self.last_segment_id
+        lobby = await self._get_lobby()
+        res = await lobby.fetch_game_live_left_segment(req)
+        if res.error.code != 0:
+            # the game is over or no longer being broadcast
+            logging.info("Live game {} ended: error {}".format(self._uuid, res.error.code))
+            self.finished = True
+            return
+        self._queue(res.segments)
+
+    async def segments(self):
+        failures = 0
+        while True:
+            while self._pending:
+                segment = self._pending[0]
+                try:
+                    actions = live_segment_actions(await self._download(segment.segment_uri))
+                except Exception as e:
+                    failures += 1
+                    if failures >= self._max_attempts:
+                        logging.info("Live game {} skipping segment {} after {} attempts: {}".format(
+                            self._uuid, segment.segment_id, failures, e))
+                        self._pending.pop(0)
+                        failures = 0
+                        continue
+                    logging.info("Live game {} segment {} ERROR: {}".format(self._uuid, segment.segment_id, e))
+                    await asyncio.sleep(self._backoff(failures))
+                    continue
+                failures = 0
+                self._pending.pop(0)
+                self.last_segment_id = max(self.last_segment_id, segment.segment_id)
+                yield segment.segment_id, actions
+
+            if self.finished:
+                return
+            try:
+                await self._poll()
+            except Exception as e:
+                failures += 1
+                logging.info("Live game {} poll ERROR: {}".format(self._uuid, e))
+                await asyncio.sleep(self._backoff(failures))
+                continue
+            failures = 0
+            if not self._pending and not self.finished:
+                await asyncio.sleep(self._interval)
+
+
+# One tailed game shared by every viewer. A single pump task downloads each
+# segment once and appends its decoded actions to an ordered list that any
+# number of subscribers read from their own offset.
+class LiveGame:
+
+    def __init__(self, uuid, tail):
+        self.uuid = uuid
+        self.tail = tail
+        self.head = None
+        self.actions = []
+        self.finished = False
+        self.subscribers = 0
+
+        self._updated = asyncio.Condition()
+        self._pump = None
+
+    async def start(self):
+        self.head = await self.tail.start()
+        self._pump = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._pump is not None:
+            self._pump.cancel()
+            try:
+                await self._pump
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        try:
+            async for segment_id, actions in self.tail.segments():
+                async with self._updated:
+                    self.actions.extend((segment_id, kind, data) for kind, data in actions)
+                    self._updated.notify_all()
+        except Exception as e:
+            logging.info("Live game {} ERROR: {}".format(self.uuid, e))
+        finally:
+            async with self._updated:
+                self.finished = True
+                self._updated.notify_all()
+
+    async def subscribe(self, offset=0):
+        # yields (offset, segment_id, kind, data) from offset on until the game ends.
+        # A negative offset would slice from the end and never advance.
+        offset = max(0, offset)
+        while True:
+            async with self._updated:
+                await self._updated.wait_for(lambda: len(self.actions) > offset or self.finished)
+                actions = self.actions[offset:]
+                finished = self.finished
+            for segment_id, kind, data in actions:
+                yield offset, segment_id, kind, data
+                offset += 1
+            if finished and offset >= len(self.actions):
+                return
+
+
+# Keeps at most one LiveGame per uuid. Games are dropped linger seconds
+# after their last subscriber leaves or after they finish; on_finished(uuid)
+# is called once a game ends so the finished record can take over.
+class LiveGameStore:
+
+    def __init__(self, create_tail, on_finished=None, linger=30.0):
+        self._create_tail = create_tail
+        self._on_finished = on_finished
+        self._linger = linger
+
+        self._games = {}
+        self._starting = {}
+        # the event loop only keeps weak references to tasks
+        self._tasks = set()
+
+    def stats(self):
+        return {
+            'games': len(self._games),
+            'subscribers': sum(game.subscribers for game in self._games.values()),
+            'actions': sum(len(game.actions) for game in self._games.values()),
+        }
+
+    async def get(self, uuid):
+        game = self._games.get(uuid)
+        if game is not None:
+            return game
+
+        # viewers arriving together share one fetchGameLiveInfo
+        task = self._starting.get(uuid)
+        if task is None:
+            task = asyncio.create_task(self._start(uuid))
+            self._starting[uuid] = task
+            task.add_done_callback(lambda _: self._starting.pop(uuid, None))
+        return await asyncio.shield(task)
+
+    async def _start(self, uuid):
+        game = LiveGame(uuid, await self._create_tail(uuid))
+        await game.start()
+        self._games[uuid] = game
+        game._pump.add_done_callback(lambda _: self._finished(game))
+        # the viewer that asked for it may be gone before it subscribes
+        self._schedule_drop(game)
+        return game
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _finished(self, game):
+        if self._on_finished is not None and game.tail.finished:
+            self._spawn(self._on_finished(game.uuid))
+        self._schedule_drop(game)
+
+    def _schedule_drop(self, game):
+        asyncio.get_running_loop().call_later(self._linger, self._drop, game)
+
+    def _drop(self, game):
+        if game.subscribers > 0 and not game.finished:
+            return
+        if self._games.get(game.uuid) is game:
+            del self._games[game.uuid]
+            self._spawn(game.stop())
+
+    async def subscribe(self, game, offset=0):
+        game.subscribers += 1
+        try:
+            async for item in game.subscribe(offset):
+                yield item
+        finally:
+            game.subscribers -= 1
+            if game.subscribers == 0:
+                self._schedule_drop(game)
+
+    async def close(self):
+        games, self._games = list(self._games.values()), {}
+        for game in games:
+            await game.stop()
+        for task in list(self._tasks):
+            task.cancel()
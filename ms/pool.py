@@ -0,0 +1,163 @@
+import asyncio
+import logging
+
+import websockets
+
+from ms.base import MSRPCTimeoutError
+
+
+class _PoolMember:
+
+    def __init__(self, lobby, channel):
+        self.lobby = lobby
+        self.channel = channel
+        self.failures = 0
+
+    def stats(self, max_failures):
+        return {
+            'healthy': self.healthy(max_failures),
+            'in_flight': self.channel.in_flight,
+            'failures': self.failures,
+        }
+
+    def healthy(self, max_failures):
+        return not self.channel.stale and self.failures < max_failures
+
+
+# Spreads RPCs over several authenticated lobby connections. The pool has the
+# same send_request() signature as MSRPCChannel, so Lobby(pool).call_method
+# goes to the least-loaded healthy member. connect_member is a coroutine
+# function returning a connected and logged in (lobby, channel) pair.
+class MSRPCChannelPool:
+
+    def __init__(self, connect_member, size=1, max_failures=3, check_interval=5.0, drain_timeout=30.0):
+        self._connect_member = connect_member
+        self._size = size
+        self._max_failures = max_failures
+        self._check_interval = check_interval
+        self._drain_timeout = drain_timeout
+
+        self._members = []
+        self._replacing = set()
+        self._maintainer = None
+
+    @property
+    def version(self):
+        return self._members[0].lobby.version if self._members else None
+
+    @property
+    def in_flight(self):
+        return sum(m.channel.in_flight for m in self._members)
+
+    @property
+    def stale(self):
+        return not any(m.healthy(self._max_failures) for m in self._members)
+
+    def stats(self):
+        return {
+            'size': self._size,
+            'replacing': len(self._replacing),
+            'members': [m.stats(self._max_failures) for m in self._members],
+        }
+
+    async def connect(self):
+        results = await asyncio.gather(*[self._connect_member() for _ in range(self._size)],
+                                       return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            # do not leave the members that did log in connected, the caller
+            # retries the whole pool
+            for result in results:
+                if not isinstance(result, BaseException):
+                    try:
+                        await result[1].close()
+                    except Exception:
+                        pass
+            raise errors[0]
+        self._members.extend(_PoolMember(lobby, channel) for lobby, channel in results)
+        self._maintainer = asyncio.create_task(self._maintain())
+
+    async def close(self):
+        if self._maintainer is not None:
+            self._maintainer.cancel()
+        replacing = list(self._replacing)
+        for task in replacing:
+            task.cancel()
+        # wait for the cancelled replacements to close what they had opened
+        await asyncio.gather(*replacing, return_exceptions=True)
+        members, self._members = self._members, []
+        for member in members:
+            try:
+                await member.channel.close()
+            except Exception:
+                pass
+
+    def _pick(self):
+        healthy = [m for m in self._members if m.healthy(self._max_failures)]
+        if not healthy:
+            raise ConnectionError('no healthy channel in pool')
+        return min(healthy, key=lambda m: m.channel.in_flight)
+
+    async def send_request(self, name, msg, timeout=None):
+        member = self._pick()
+        try:
+            res = await member.channel.send_request(name, msg, timeout=timeout)
+        except (MSRPCTimeoutError, ConnectionError, websockets.ConnectionClosed):
+            member.failures += 1
+            raise
+        member.failures = 0
+        return res
+
+    # Starts replacing the unhealthy members right away instead of on the
+    # next check and waits up to timeout for one to become usable. Returns
+    # False when the pool could not repair itself in time, the caller then
+    # has to rebuild it.
+    async def repair(self, timeout):
+        self._sweep()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.stale and self._replacing and loop.time() < deadline:
+            await asyncio.sleep(0.1)
+        return not self.stale
+
+    def _sweep(self):
+        for member in list(self._members):
+            if not member.healthy(self._max_failures):
+                self._members.remove(member)
+                task = asyncio.create_task(self._replace(member))
+                self._replacing.add(task)
+                task.add_done_callback(self._replacing.discard)
+
+    async def _maintain(self):
+        while True:
+            await asyncio.sleep(self._check_interval)
+            self._sweep()
+
+    async def _replace(self, member):
+        logging.info("Replacing unhealthy pool channel ({} in flight)".format(member.channel.in_flight))
+
+        # let outstanding requests on the old socket finish before closing it,
+        # the member is no longer in the pool so nothing else closes it
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._drain_timeout
+        try:
+            while member.channel.in_flight and member.channel.is_open and loop.time() < deadline:
+                await asyncio.sleep(0.1)
+        finally:
+            try:
+                await member.channel.close()
+            except Exception:
+                pass
+
+        delay = 1.0
+        while True:
+            try:
+                lobby, channel = await self._connect_member()
+            except Exception as e:
+                logging.info("Pool reconnect ERROR: {}".format(e))
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60.0)
+                continue
+            self._members.append(_PoolMember(lobby, channel))
+            logging.info("Pool channel replaced")
+            return
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import random
+import time
+
+
+# Runs at most one reconnect at a time. Callers that arrive while a reconnect
+# is in progress await the same attempt instead of starting their own.
+class ReconnectCoordinator:
+
+    def __init__(self, reconnect, base_delay=1.0, max_delay=30.0, max_attempts=5):
+        self._reconnect = reconnect
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._max_attempts = max_attempts
+
+        self._task = None
+        self._state = 'idle'
+        self._attempt = 0
+        self._waiters = 0
+        self._next_retry = None
+        self._last_error = None
+        self._last_success = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def status(self):
+        return {
+            'state': self._state,
+            'running': self.running,
+            'attempt': self._attempt,
+            'waiters': self._waiters,
+            'next_retry': self._next_retry,
+            'last_error': self._last_error,
+            'last_success': self._last_success,
+        }
+
+    async def run(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+        self._waiters += 1
+        try:
+            # shield so a caller going away does not abort the shared reconnect
+            await asyncio.shield(self._task)
+        finally:
+            self._waiters -= 1
+
+    def _backoff(self, attempt):
+        # full jitter keeps several workers from retrying in lockstep
+        return random.uniform(0, min(self._max_delay, self._base_delay * 2 ** attempt))
+
+    async def _run(self):
+        self._attempt = 0
+        while True:
+            self._attempt += 1
+            self._state = 'connecting'
+            self._next_retry = None
+            try:
+                await self._reconnect()
+            except Exception as e:
+                logging.info("Reconnect attempt {} ERROR: {}".format(self._attempt, e))
+                self._last_error = str(e)
+                if self._attempt >= self._max_attempts:
+                    self._state = 'failed'
+                    raise ConnectionError("Reconnect failed after {} attempts: {}".format(self._attempt, e)) from e
+                delay = self._backoff(self._attempt - 1)
+                self._state = 'backoff'
+                self._next_retry = time.time() + delay
+                await asyncio.sleep(delay)
+                continue
+
+            self._state = 'idle'
+            self._last_error = None
+            self._last_success = time.time()
+            return
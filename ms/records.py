@@ -0,0 +1,291 @@
+import base64
+import logging
+import math
+
+from google.protobuf.descriptor import FieldDescriptor
+from google.protobuf.internal import type_checkers
+from google.protobuf.json_format import MessageToDict
+
+import ms.protocol_pb2 as pb
+
+
+NEW_ROUND = 'new_round'
+TILE = 'tile'
+EVENT = 'event'
+
+# records that move a tile, emitted in the round's "Tile" list
+TILE_TYPES = {
+    'RecordDiscardTile': 'Discard',
+    'RecordDealTile': 'Draw',
+    'RecordChiPengGang': 'Call',
+    'RecordBaBei': 'Pei',
+    'RecordAnGangAddGang': None,
+}
+
+KAN_TYPES = {
+    2: 'AddKan',
+    3: 'AnKan',
+}
+
+
+def _set_tile_type(tile_type):
+    def post(record):
+        record["TileType"] = tile_type
+        return record
+    return post
+
+
+def _an_gang_add_gang(record):
+    if record["type"] in KAN_TYPES:
+        record["TileType"] = KAN_TYPES[record["type"]]
+
+    record["tile"] = record.pop("tiles")
+    record.pop("type", None)
+    return record
+
+
+def _set_event_type(event_type):
+    def post(record):
+        record["EventType"] = event_type
+        return record
+    return post
+
+
+class RecordDecoder:
+
+    __slots__ = ('name', 'kind', 'message', 'post')
+
+    def __init__(self, name, message_class, kind, post=None):
+        self.name = name
+        self.kind = kind
+        # one message instance per type, ParseFromString clears it before reuse
+        self.message = message_class()
+        self.post = post
+
+    def decode(self, data):
+        self.message.ParseFromString(data)
+        record = message_to_dict(self.message)
+        if self.post is not None:
+            record = self.post(record)
+        return record
+
+
+def _build_decoders():
+    decoders = {}
+    for name, descriptor in pb.DESCRIPTOR.message_types_by_name.items():
+        # finished games store Record* messages, live games stream the
+        # matching Action* messages with the same layout
+        if name.startswith('Record'):
+            record_name = name
+        elif name.startswith('Action'):
+            record_name = 'Record' + name[len('Action'):]
+        else:
+            continue
+
+        message_class = getattr(pb, name)
+        if record_name == 'RecordNewRound':
+            decoder = RecordDecoder(name, message_class, NEW_ROUND)
+        elif record_name == 'RecordAnGangAddGang':
+            decoder = RecordDecoder(name, message_class, TILE, _an_gang_add_gang)
+        elif record_name in TILE_TYPES:
+            decoder = RecordDecoder(name, message_class, TILE, _set_tile_type(TILE_TYPES[record_name]))
+        else:
+            decoder = RecordDecoder(name, message_class, EVENT, _set_event_type(record_name[len('Record'):]))
+
+        # wrappers name their payload by full name with a leading dot
+        decoders['.' + descriptor.full_name] = decoder
+    return decoders
+
+
+RECORD_DECODERS = _build_decoders()
+
+
+# fetchGameRecord answered with an error code or the record cannot be used
+class GameRecordError(Exception):
+    pass
+
+
+class GameRecordNotFound(GameRecordError):
+    pass
+
+
+def game_records(data):
+    record_wrapper = pb.Wrapper()
+    record_wrapper.ParseFromString(data)
+
+    game_details = pb.GameDetailRecords()
+    game_details.ParseFromString(record_wrapper.data)
+
+    # older records list wrapped records directly, newer ones nest them in actions
+    if len(game_details.records) != 0:
+        return game_details.records
+    return [action.result for action in game_details.actions if len(action.result) > 0]
+
+
+def game_header(res):
+    header = message_to_dict(res.head)
+    header["Data_Url"] = res.data_url
+    return header
+
+
+# Yields each round dict once it is complete, that is when the next
+# RecordNewRound arrives or the records run out.
+def iter_rounds(records):
+    round_record_wrapper = pb.Wrapper()
+    current = None
+
+    for record in records:
+        round_record_wrapper.ParseFromString(record)
+
+        decoder = RECORD_DECODERS.get(round_record_wrapper.name)
+        if decoder is None:
+            continue
+
+        data = decoder.decode(round_record_wrapper.data)
+
+        if decoder.kind == NEW_ROUND:
+            if current is not None:
+                yield current
+            data["Tile"] = []
+            current = data
+        elif current is None:
+            logging.info("Skipping {} before the first round".format(round_record_wrapper.name))
+        elif decoder.kind == TILE:
+            current["Tile"].append(data)
+        else:
+            current.setdefault("Events", []).append(data)
+
+    if current is not None:
+        yield current
+
+
+def decode_wrapped(wrapped):
+    wrapper = pb.Wrapper()
+    wrapper.ParseFromString(wrapped)
+
+    decoder = RECORD_DECODERS.get(wrapper.name)
+    if decoder is None:
+        return None
+    return decoder.kind, decoder.decode(wrapper.data)
+
+
+def live_segment_actions(data):
+    # segment files are normally a Wrapper around GameLiveSegment, accept a
+    # bare GameLiveSegment as well
+    wrapper = pb.Wrapper()
+    wrapper.ParseFromString(data)
+    if wrapper.name == '.lq.GameLiveSegment':
+        data = wrapper.data
+
+    segment = pb.GameLiveSegment()
+    segment.ParseFromString(data)
+
+    actions = []
+    for unit in segment.actions:
+        if len(unit.action_data) == 0:
+            continue
+        decoded = decode_wrapped(unit.action_data)
+        if decoded is not None:
+            actions.append(decoded)
+    return actions
+
+
+def game_record_as_json(res):
+    game = game_header(res)
+    game["Rounds"] = list(iter_rounds(game_records(res.data)))
+    return {"Game": game}
+
+
+# MessageToDict walks the descriptor and re-derives each field's JSON name and
+# conversion for every message it sees. For the replay hot path the same
+# conversion is compiled once per message type into a plan keyed by field
+# descriptor, producing the same output as MessageToDict with default options.
+_FALLBACK = object()
+_plans = {}
+
+_INT64_TYPES = (
+    FieldDescriptor.CPPTYPE_INT64,
+    FieldDescriptor.CPPTYPE_UINT64,
+)
+
+
+def _float_value(value):
+    if math.isinf(value):
+        return '-Infinity' if value < 0.0 else 'Infinity'
+    if math.isnan(value):
+        return 'NaN'
+    return value
+
+
+def _short_float_value(value):
+    value = _float_value(value)
+    if isinstance(value, str):
+        return value
+    return type_checkers.ToShortestFloat(value)
+
+
+def _bytes_value(value):
+    return base64.b64encode(value).decode('utf-8')
+
+
+def _enum_value(enum_type):
+    names = {v.number: v.name for v in enum_type.values}
+
+    def conv(value):
+        return names.get(value, value)
+    return conv
+
+
+def _field_converter(field):
+    if field.cpp_type == FieldDescriptor.CPPTYPE_MESSAGE:
+        return message_to_dict
+    if field.cpp_type == FieldDescriptor.CPPTYPE_ENUM:
+        return _enum_value(field.enum_type)
+    if field.type == FieldDescriptor.TYPE_BYTES:
+        return _bytes_value
+    if field.cpp_type in _INT64_TYPES:
+        return str
+    if field.cpp_type == FieldDescriptor.CPPTYPE_FLOAT:
+        return _short_float_value
+    if field.cpp_type == FieldDescriptor.CPPTYPE_DOUBLE:
+        return _float_value
+    # strings, bools and 32 bit integers are already JSON values
+    return None
+
+
+def _compile_plan(descriptor):
+    # well known types have their own JSON mapping, leave them to json_format
+    if descriptor.full_name.startswith('google.protobuf.'):
+        return _FALLBACK
+
+    plan = {}
+    for field in descriptor.fields:
+        if field.message_type is not None and field.message_type.GetOptions().map_entry:
+            return _FALLBACK
+        if field.enum_type is not None and field.enum_type.full_name == 'google.protobuf.NullValue':
+            return _FALLBACK
+        repeated = field.label == FieldDescriptor.LABEL_REPEATED
+        plan[field] = (field.json_name, _field_converter(field), repeated)
+    return plan
+
+
+def message_to_dict(message):
+    descriptor = message.DESCRIPTOR
+    plan = _plans.get(descriptor)
+    if plan is None:
+        plan = _plans[descriptor] = _compile_plan(descriptor)
+    if plan is _FALLBACK:
+        return MessageToDict(message)
+
+    js = {}
+    for field, value in message.ListFields():
+        entry = plan.get(field)
+        if entry is None:
+            # extensions are not part of the compiled plan
+            return MessageToDict(message)
+        name, conv, repeated = entry
+        if repeated:
+            js[name] = list(value) if conv is None else [conv(v) for v in value]
+        else:
+            js[name] = value if conv is None else conv(value)
+    return js
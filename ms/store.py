@@ -0,0 +1,90 @@
+import asyncio
+import sqlite3
+import threading
+import time
+import zlib
+
+
+# Persistent store of raw record payloads keyed by game uuid. Values are
+# compressed with zlib and kept in a single SQLite file; once the compressed
+# total goes over max_bytes the least recently read records are deleted.
+class RecordStore:
+
+    def __init__(self, path, max_bytes):
+        self._path = path
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            " uuid TEXT PRIMARY KEY,"
+            " data BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS records_accessed ON records (accessed)")
+        self._db.commit()
+        self._bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM records").fetchone()[0]
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        return {
+            'path': self._path,
+            'bytes': self._bytes,
+            'max_bytes': self._max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    async def get(self, uuid):
+        return await asyncio.to_thread(self._get, uuid)
+
+    async def put(self, uuid, data):
+        await asyncio.to_thread(self._put, uuid, data)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _get(self, uuid):
+        with self._lock:
+            row = self._db.execute("SELECT data FROM records WHERE uuid = ?", (uuid,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE records SET accessed = ? WHERE uuid = ?", (time.time(), uuid))
+            self._db.commit()
+        self.hits += 1
+        return zlib.decompress(row[0])
+
+    def _put(self, uuid, data):
+        blob = zlib.compress(data)
+        with self._lock:
+            old = self._db.execute("SELECT size FROM records WHERE uuid = ?", (uuid,)).fetchone()
+            if old is not None:
+                self._bytes -= old[0]
+            self._db.execute(
+                "INSERT OR REPLACE INTO records (uuid, data, size, accessed) VALUES (?, ?, ?, ?)",
+                (uuid, blob, len(blob), time.time()),
+            )
+            self._bytes += len(blob)
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        while self._bytes > self._max_bytes:
+            rows = self._db.execute("SELECT uuid, size FROM records ORDER BY accessed LIMIT 64").fetchall()
+            if not rows:
+                break
+            for uuid, size in rows:
+                if self._bytes <= self._max_bytes:
+                    break
+                self._db.execute("DELETE FROM records WHERE uuid = ?", (uuid,))
+                self._bytes -= size
+                self.evictions += 1
@@ -0,0 +1,17 @@
+import orjson
+from fastapi.responses import Response
+
+
+def json_dumps(content):
+    # live lists are keyed by integer mode ids
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+# Renders plain dict/list payloads straight to bytes. Returning an instance of
+# this from an endpoint skips FastAPI's jsonable_encoder pass, so it must only
+# be used for content that is already JSON-ready, like the replay dicts.
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        return json_dumps(content)